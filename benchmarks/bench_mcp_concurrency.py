@@ -0,0 +1,112 @@
+"""Throughput of the MCP tools when an assistant issues several tool calls at once.
+
+Runs a mixed batch of tool calls against a fake instagrapi client whose every request sleeps for a
+fixed latency, first one call at a time (how the server behaved while tools were synchronous) and
+then all at once through the async tools. Nothing is sent to Instagram.
+
+    python benchmarks/bench_mcp_concurrency.py --calls 48 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+# Keep the server's caches out of the working directory
+_tmp = tempfile.mkdtemp(prefix="bench_mcp_")
+os.environ.setdefault("INSTAGRAM_CACHE_DB", os.path.join(_tmp, "cache.db"))
+os.environ.setdefault("INSTAGRAM_MEDIA_CACHE_DIR", os.path.join(_tmp, "media"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import mcp_server  # noqa: E402
+
+
+def fake_user(pk):
+    return SimpleNamespace(
+        pk=pk, username=f"user{pk}", full_name=f"User {pk}", biography="", follower_count=10,
+        following_count=10, media_count=1, is_private=False, is_verified=False,
+        profile_pic_url=None, external_url=None, category=None,
+    )
+
+
+class FakeClient:
+    """Answers the calls the benchmarked tools make, each after `latency` seconds."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def _wait(self):
+        time.sleep(self.latency)
+
+    def user_id_from_username(self, username):
+        self._wait()
+        return str(abs(hash(username)) % 10**9)
+
+    def user_info_by_username(self, username):
+        self._wait()
+        return fake_user(1)
+
+    def user_followers(self, user_id, amount=20):
+        self._wait()
+        return {str(pk): fake_user(pk) for pk in range(amount)}
+
+    def search_users(self, query):
+        self._wait()
+        return [fake_user(pk) for pk in range(5)]
+
+    def direct_send(self, text, user_ids):
+        self._wait()
+        return SimpleNamespace(id="1", thread_id=None)
+
+
+def workload(calls, run):
+    """(tool, kwargs) pairs cycling through lookups, list fetches, searches and sends.
+
+    Usernames include the run name, so the second run cannot hit the username cache warmed by the first.
+    """
+    tools = [
+        (mcp_server.get_user_info, lambda i: {"username": f"{run}info{i}"}),
+        (mcp_server.get_user_followers, lambda i: {"username": f"{run}target{i}", "count": 10}),
+        (mcp_server.search_users, lambda i: {"query": f"{run}query{i}"}),
+        (mcp_server.send_message, lambda i: {"username": f"{run}lead{i}", "message": "hola"}),
+    ]
+    return [(tools[i % len(tools)][0], tools[i % len(tools)][1](i)) for i in range(calls)]
+
+
+def run_sequential(calls):
+    start = time.perf_counter()
+    for tool, kwargs in workload(calls, "sequential"):
+        tool.__wrapped__(**kwargs)
+    return time.perf_counter() - start
+
+
+async def run_concurrent(calls):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(tool(**kwargs) for tool, kwargs in workload(calls, "concurrent")))
+    elapsed = time.perf_counter() - start
+    failed = [r for r in results if not r.get("success")]
+    if failed:
+        raise RuntimeError(f"{len(failed)} tool calls failed, e.g. {failed[0]}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=48, help="Tool calls per run")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds each fake Instagram request takes")
+    args = parser.parse_args()
+
+    mcp_server.client_pool.add("bench", FakeClient(args.latency), default=True)
+
+    sequential = run_sequential(args.calls)
+    concurrent = asyncio.run(run_concurrent(args.calls))
+
+    print(f"{args.calls} tool calls, {args.latency * 1000:.0f} ms per Instagram request, {mcp_server.TOOL_WORKERS} workers")
+    print(f"  one at a time: {sequential:6.2f} s  {args.calls / sequential:7.1f} calls/s")
+    print(f"  concurrent:    {concurrent:6.2f} s  {args.calls / concurrent:7.1f} calls/s  ({sequential / concurrent:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Startup time of the MCP server: module import and time until it is ready to serve.
+
+Each run starts a fresh interpreter that imports src.mcp_server and runs prepare() with an
+account that has a saved session, i.e. everything main() does before handing stdio to the MCP
+loop. No request is sent to Instagram. The cost of importing instagrapi, which the server now
+defers to the first tool call, is measured separately for comparison.
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVER_STARTUP = """
+import json, sys, time
+start = time.perf_counter()
+from src import mcp_server
+imported = time.perf_counter()
+mcp_server.prepare(mcp_server.build_parser().parse_args(["--username", "bench"]))
+ready = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "ready": ready - start,
+    "instagrapi_loaded": "instagrapi" in sys.modules,
+}))
+"""
+
+INSTAGRAPI_IMPORT = """
+import json, time
+start = time.perf_counter()
+import instagrapi
+print(json.dumps({"import": time.perf_counter() - start}))
+"""
+
+
+def run_child(code, cwd, env):
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process"] = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Interpreter launches per measurement")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    # A saved session, so prepare() accepts the account without a password
+    settings = {"authorization_data": {"sessionid": "bench"}, "last_login": time.time()}
+    with open(os.path.join(workdir, "bench_session.json"), "w") as f:
+        json.dump(settings, f)
+    env = dict(
+        os.environ,
+        PYTHONPATH=REPO_ROOT,
+        INSTAGRAM_SESSION_DIR=workdir,
+        INSTAGRAM_CACHE_DB=os.path.join(workdir, "cache.db"),
+        INSTAGRAM_MEDIA_CACHE_DIR=os.path.join(workdir, "media"),
+    )
+    env.pop("INSTAGRAM_MIRROR_DB", None)
+
+    runs = [run_child(SERVER_STARTUP, workdir, env) for _ in range(args.runs)]
+    instagrapi = [run_child(INSTAGRAPI_IMPORT, workdir, env) for _ in range(args.runs)]
+
+    def median_ms(results, key):
+        return statistics.median(r[key] for r in results) * 1000
+
+    print(f"median of {args.runs} runs")
+    print(f"  import src.mcp_server:   {median_ms(runs, 'import'):7.1f} ms")
+    print(f"  ready to serve:          {median_ms(runs, 'ready'):7.1f} ms")
+    print(f"  whole process:           {median_ms(runs, 'process'):7.1f} ms")
+    print(f"  instagrapi loaded:       {any(r['instagrapi_loaded'] for r in runs)}")
+    print(f"  import instagrapi alone: {median_ms(instagrapi, 'import'):7.1f} ms (deferred to the first tool call)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,15 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-import threading
-import time
-import sqlite3
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from typing import Optional
 from src.agent import InstagramAppointmentSetter
+from src.lead_store import LeadStore
+from src.runtime import AgentRuntime
 import os
 
 app = FastAPI(title="Instagram DM Agent MVP", description="API for controlling the Instagram DM appointment setter agent")
@@ -21,10 +23,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global variables for agent control
-agent_instance: Optional[InstagramAppointmentSetter] = None
-agent_thread: Optional[threading.Thread] = None
-agent_running = False
+# All agents run as tasks on this app's event loop, keyed by Instagram username
+runtime = AgentRuntime()
+
+# Blocking work done for API requests (opening lead databases, KPIs, search). Kept apart from the
+# runtime's pool, whose workers can be busy with agent steps for minutes.
+api_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="api")
+
+# Usernames whose agent is being built, so two concurrent start requests cannot both start one
+starting = set()
 
 class AgentConfig(BaseModel):
     username: str
@@ -39,123 +46,159 @@ def get_db_path(username: str) -> str:
     clean_username = username.replace('@', '').replace('.', '_').replace('-', '_')
     return f"leads_{clean_username}.db"
 
-def run_agent_background(config: AgentConfig):
-    """Function to run the agent in background thread"""
-    global agent_instance, agent_running
-
-    try:
-        # Generate unique database path for this account
-        db_path = get_db_path(config.username)
-
-        # Create agent instance with custom database
-        agent_instance = InstagramAppointmentSetter(
-            username=config.username,
-            password=config.password,
-            verification_code=config.verification_code,
-            api_key=config.api_key,
-            db_path=db_path
-        )
-
-        # Login
-        agent_instance.login()
-
-        # Run the agent loop
-        agent_running = True
-        agent_instance.run(target_account=config.target_account)
-
-    except Exception as e:
-        print(f"Agent error: {e}")
-        agent_running = False
+def build_agent(config: AgentConfig) -> InstagramAppointmentSetter:
+    """Create an agent instance with its own per-account database"""
+    return InstagramAppointmentSetter(
+        username=config.username,
+        password=config.password,
+        verification_code=config.verification_code,
+        api_key=config.api_key,
+        db_path=get_db_path(config.username)
+    )
 
 @app.post("/api/start-agent")
-async def start_agent(config: AgentConfig, background_tasks: BackgroundTasks):
+async def start_agent(config: AgentConfig):
     """Start the Instagram DM agent"""
-    global agent_thread, agent_running
-
-    if agent_running:
+    if runtime.is_running(config.username) or config.username in starting:
         raise HTTPException(status_code=400, detail="Agent is already running")
 
-    # Start agent in background
-    background_tasks.add_task(run_agent_background, config)
+    starting.add(config.username)
+    try:
+        # Building the agent opens its database and Instagram client, so keep it off the event loop
+        agent = await asyncio.get_running_loop().run_in_executor(api_executor, build_agent, config)
+        runtime.start(config.username, agent, target_account=config.target_account)
+    finally:
+        starting.discard(config.username)
 
     return {"message": "Agent started successfully", "status": "running"}
 
 @app.post("/api/stop-agent")
-async def stop_agent():
-    """Stop the Instagram DM agent"""
-    global agent_instance, agent_running
-
-    if not agent_running:
+async def stop_agent(username: Optional[str] = None):
+    """Stop one agent, or every agent when no username is given"""
+    keys = [username] if username else list(runtime.statuses())
+    keys = [key for key in keys if runtime.is_running(key)]
+    if not keys:
         raise HTTPException(status_code=400, detail="Agent is not running")
 
-    # Note: In a real implementation, you'd need a proper way to stop the agent
-    # For now, we'll just set the flag
-    agent_running = False
+    for key in keys:
+        await runtime.stop(key)
+
+    return {"message": "Agent stopped", "status": "stopped"}
 
-    return {"message": "Agent stop signal sent", "status": "stopping"}
+@app.post("/api/pause-agent")
+async def pause_agent(username: str):
+    """Pause an agent without dropping its session"""
+    if not runtime.pause(username):
+        raise HTTPException(status_code=400, detail="Agent is not running")
+    return {"message": "Agent paused", "status": "paused"}
+
+@app.post("/api/resume-agent")
+async def resume_agent(username: str):
+    """Resume a paused agent"""
+    if not runtime.resume(username):
+        raise HTTPException(status_code=400, detail="Agent is not paused")
+    return {"message": "Agent resumed", "status": "running"}
 
 @app.get("/api/status")
 async def get_agent_status():
-    """Get the current status of the agent"""
-    global agent_running
+    """Get the current status of the agents"""
+    agents = runtime.statuses()
+    running = any(runtime.is_running(key) for key in agents)
 
     return {
-        "running": agent_running,
-        "status": "running" if agent_running else "stopped"
+        "running": running,
+        "status": "running" if running else "stopped",
+        "agents": agents
     }
 
-@app.get("/api/kpis/{username}")
-async def get_kpis(username: str):
-    """Get Key Performance Indicators from the database for a specific account"""
+@app.on_event("shutdown")
+async def shutdown_agents():
+    """Stop every agent when the server shuts down"""
+    await runtime.stop_all()
+
+@contextmanager
+def account_store(username: str):
+    """Yield an account's lead database, reusing the running agent's store when there is one"""
+    agent = runtime.agent(username)
+    if agent is not None:
+        yield agent.store
+        return
+    store = LeadStore(get_db_path(username))
     try:
-        # Get the database path for this username
-        db_path = get_db_path(username)
-
-        # Check if database exists
-        if not os.path.exists(db_path):
-            return {
-                "total_messages_sent": 0,
-                "total_replies": 0,
-                "total_qualified": 0,
-                "response_rate": 0.0,
-                "qualification_rate": 0.0,
-                "message": "No data available for this account yet"
-            }
-
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        # Get total messages sent today
-        cursor.execute("SELECT COUNT(*) FROM leads WHERE DATE(last_contacted_at) = DATE('now', 'localtime')")
-        total_messages_sent = cursor.fetchone()[0]
+        yield store
+    finally:
+        store.close()
+
+def read_kpis(username: str) -> dict:
+    """Compute the KPIs of an account from its lead database"""
+    with account_store(username) as store:
+        # Get total messages sent today (from the daily send ledger, so replies are not counted)
+        total_messages_sent = store.sends_today()
 
         # Get total replies received
-        cursor.execute("SELECT COUNT(*) FROM leads WHERE status = 'replied'")
-        total_replies = cursor.fetchone()[0]
+        total_replies = store.count_with_status('replied')
 
         # Get total qualified leads (leads that received a response from the AI)
-        cursor.execute("SELECT COUNT(*) FROM leads WHERE status = 'replied'")
-        total_qualified = cursor.fetchone()[0]
+        total_qualified = store.count_with_status('replied')
 
-        # Calculate response rate
-        response_rate = (total_replies / total_messages_sent * 100) if total_messages_sent > 0 else 0
+    # Calculate response rate
+    response_rate = (total_replies / total_messages_sent * 100) if total_messages_sent > 0 else 0
 
-        # Calculate qualification rate
-        qualification_rate = (total_qualified / total_replies * 100) if total_replies > 0 else 0
+    # Calculate qualification rate
+    qualification_rate = (total_qualified / total_replies * 100) if total_replies > 0 else 0
 
-        conn.close()
+    return {
+        "total_messages_sent": total_messages_sent,
+        "total_replies": total_replies,
+        "total_qualified": total_qualified,
+        "response_rate": round(response_rate, 2),
+        "qualification_rate": round(qualification_rate, 2)
+    }
 
+@app.get("/api/kpis/{username}")
+async def get_kpis(username: str):
+    """Get Key Performance Indicators from the database for a specific account"""
+    # Check if database exists
+    if not os.path.exists(get_db_path(username)):
         return {
-            "total_messages_sent": total_messages_sent,
-            "total_replies": total_replies,
-            "total_qualified": total_qualified,
-            "response_rate": round(response_rate, 2),
-            "qualification_rate": round(qualification_rate, 2)
+            "total_messages_sent": 0,
+            "total_replies": 0,
+            "total_qualified": 0,
+            "response_rate": 0.0,
+            "qualification_rate": 0.0,
+            "message": "No data available for this account yet"
         }
 
+    try:
+        # Opening the database runs its schema setup, so keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(api_executor, read_kpis, username)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching KPIs: {str(e)}")
 
+def search_leads(username: str, q: str, limit: int, offset: int, status: Optional[str]):
+    """Run a conversation search against an account's lead database"""
+    with account_store(username) as store:
+        return store.search_conversations(q, limit=limit, offset=offset, status=status)
+
+@app.get("/api/search/{username}")
+async def search_conversations(username: str, q: str, limit: int = 20, offset: int = 0, status: Optional[str] = None):
+    """Full-text search over an account's lead conversations, best match first, one lead per result"""
+    if not os.path.exists(get_db_path(username)):
+        return {"results": [], "next_offset": None, "message": "No data available for this account yet"}
+
+    try:
+        # The query runs on SQLite, so keep it off the event loop
+        results, has_more = await asyncio.get_running_loop().run_in_executor(
+            api_executor, search_leads, username, q, limit, offset, status
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching conversations: {str(e)}")
+
+    return {
+        "results": results,
+        "next_offset": offset + len(results) if has_more else None
+    }
+
 @app.get("/", response_class=HTMLResponse)
 async def root():
     """Serve the main HTML interface"""
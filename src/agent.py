@@ -1,12 +1,26 @@
 import os
 import time
 import random
-import sqlite3
+import threading
+from collections import deque
 from dotenv import load_dotenv
 from instagrapi import Client
 from instagrapi.exceptions import TwoFactorRequired
 import logging
 import google.generativeai as genai
+
+try:
+    from src.lead_store import LeadStore
+    from src.harvester import FollowerHarvester
+    from src.reply_pipeline import ReplyPipeline
+    from src.scheduler import SendScheduler
+    from src.throttle import Throttle, ThrottledClient
+except ImportError:  # Running as a script from inside src/
+    from lead_store import LeadStore
+    from harvester import FollowerHarvester
+    from reply_pipeline import ReplyPipeline
+    from scheduler import SendScheduler
+    from throttle import Throttle, ThrottledClient
 # =================================================================================================
 
 # Load environment variables from .env file
@@ -101,47 +115,110 @@ INITIAL_MESSAGE_TEMPLATES = [
     "Hola {full_name}, ¿cómo estás? Soy Alejandro Rojas, experto en energía de EcoFlow. Vi que sigues a @{target_account} y me animé a escribirte. En Venezuela, tener un respaldo de energía es clave. Justo ahora, tenemos unas ofertas excelentes en estaciones EcoFlow. Si te interesa, puedo darte todos los detalles sin compromiso para que veas cuál se adapta mejor a tus necesidades. ¿Te viene bien por aquí o te paso mi WhatsApp? ¡Que tengas un buen día!"
 ]
 
+# Static part of every reply prompt. It is identical for every lead, so it is built once and handed
+# to Gemini as the model's system instruction instead of being re-sent inside each request body.
+# (Gemini context caching needs a prefix of at least 32k tokens; this one is far smaller.)
+REPLY_SYSTEM_INSTRUCTION = (
+    f"{SYSTEM_PROMPT}\n\n"
+    f"**Contexto de Venezuela:**\n{VENEZUELA_CONTEXT}\n\n"
+    f"**Base de Conocimiento de Productos:**\n{ECOFLOW_KNOWLEDGE_BASE}\n\n"
+    f"**Metodología de Ventas:**\n{SALES_METHODOLOGY}\n\n"
+    "**Tu Tarea:** Responde al último mensaje del lead de manera empática y consultiva. "
+    "Usa tu conocimiento para guiar la conversación, identificar sus necesidades y acercarlo a una solución. "
+    "Si te piden precios, usa la base de conocimiento. Si hacen preguntas técnicas, respóndelas. "
+    "Tu objetivo es calificar al lead. No termines la conversación, siempre haz una pregunta abierta para continuar."
+)
+
+# Rough token budget for the conversation part of a reply prompt. Older turns are dropped first.
+HISTORY_TOKEN_BUDGET = 1500
+CHARS_PER_TOKEN = 4
+
+# How stored message roles are labelled in the prompt
+ROLE_LABELS = {"lead": "LEAD", "agent": "ALEJANDRO"}
+
+# Messages included per thread in the inbox listing, and fetched when a thread must be read in full
+INBOX_MESSAGE_LIMIT = 10
+THREAD_FETCH_LIMIT = 20
+
+# Reply pipeline sizing: parallel thread reads, parallel Gemini calls, and the minimum gap between
+# two replies sent from the same account (seconds)
+REPLY_FETCH_WORKERS = 4
+REPLY_LLM_WORKERS = 4
+REPLY_MIN_SEND_INTERVAL = 5.0
+
+# Outreach pacing: local hours during which initial messages are sent, how often replies are checked
+# (seconds), and the shortest sleep between two loop steps
+DEFAULT_ACTIVE_HOURS = (9, 21)
+REPLY_CHECK_SECONDS = 120
+MIN_STEP_SECONDS = 1.0
+
+# Instagram calls from one account: most in flight at once and the shortest gap between two of them
+# (seconds). Both shrink while Instagram is rate limiting the account.
+CLIENT_MAX_CONCURRENCY = REPLY_FETCH_WORKERS
+CLIENT_MIN_INTERVAL = 1.0
+
+def estimate_tokens(text):
+    """Cheap token estimate (about four characters per token for Spanish/English text)."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def conversation_window(turns, token_budget=HISTORY_TOKEN_BUDGET):
+    """Returns the most recent turns that fit in the token budget, oldest first.
+
+    The newest turn is always kept; if it alone exceeds the budget only its tail is used.
+    """
+    window = []
+    used = 0
+    for turn in reversed(turns):
+        cost = estimate_tokens(turn)
+        if used + cost > token_budget:
+            if not window:
+                window.append(turn[-token_budget * CHARS_PER_TOKEN:])
+            break
+        window.append(turn)
+        used += cost
+    window.reverse()
+    return "\n".join(window)
+
+
 # =================================================================================================
 # MAIN AGENT CLASS
 # =================================================================================================
 
 class InstagramAppointmentSetter:
     def __init__(self, username, password, verification_code=None, api_key=None, db_path=None):
-        self.client = Client()
+        self.throttle = Throttle(username, max_concurrency=CLIENT_MAX_CONCURRENCY, min_interval=CLIENT_MIN_INTERVAL)
+        self.client = ThrottledClient(Client(), self.throttle)
         self.my_user_id = None
         self.username = username
         self.password = password
         self.verification_code = verification_code
         # Use custom database path if provided, otherwise use default
         self.db_path = db_path or "leads.db"
-        self._setup_database()
+        self.store = LeadStore(self.db_path)
+        self.harvester = FollowerHarvester(self.client, self.store)
+        # Fresh followers already harvested but not messaged yet, per target account
+        self._candidate_queues = {}
+        # Set to make run()/step() and the reply pipeline stop starting new work
+        self.stop_requested = threading.Event()
+        self.reply_pipeline = ReplyPipeline(
+            fetch=self._collect_reply,
+            generate=self._generate_for,
+            send=self._send_and_settle,
+            fetch_workers=REPLY_FETCH_WORKERS,
+            llm_workers=REPLY_LLM_WORKERS,
+            min_send_interval=REPLY_MIN_SEND_INTERVAL,
+            stop_event=self.stop_requested,
+        )
 
         if api_key:
             genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
+            self.model = genai.GenerativeModel('gemini-1.5-flash', system_instruction=REPLY_SYSTEM_INSTRUCTION)
             logger.info("Google AI SDK configured successfully.")
         else:
             self.model = None
             logger.warning("API key not provided. Conversational features will be disabled.")
 
-    def _setup_database(self):
-        """Initializes the SQLite database and creates the leads table if it doesn't exist."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS leads (
-                user_id TEXT PRIMARY KEY,
-                username TEXT NOT NULL,
-                full_name TEXT,
-                status TEXT DEFAULT 'contacted', -- contacted, replied, qualified, transferred, ignored
-                last_contacted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                conversation_history TEXT
-            )
-        ''')
-        conn.commit()
-        conn.close()
-        logger.info(f"Database '{self.db_path}' setup complete.")
-
     def login(self):
         """Logs into Instagram, handling sessions and 2FA."""
         session_file = f"{self.username}_agent_session.json"
@@ -163,68 +240,55 @@ class InstagramAppointmentSetter:
         self.my_user_id = self.client.user_id
         logger.info(f"Login successful. Session saved to {session_file}. Logged in as user ID: {self.my_user_id}")
 
-    def get_followers(self, target_username, amount=500):
-        """Gets a list of followers from a target account."""
-        logger.info(f"Fetching followers for {target_username}...")
-        try:
-            user_id = self.client.user_id_from_username(target_username)
-            followers = self.client.user_followers(user_id, amount=amount)
-            logger.info(f"Successfully fetched {len(followers)} followers.")
-            return list(followers.values())
-        except Exception as e:
-            logger.error(f"Could not fetch followers for {target_username}: {e}")
-            return []
+    def next_candidates(self, target_account, needed):
+        """Returns the outreach queue for a target, harvesting more followers only when it runs short."""
+        queue = self._candidate_queues.setdefault(target_account, deque())
+        if len(queue) < needed:
+            try:
+                queued_ids = {str(user.pk) for user in queue}
+                queue.extend(self.harvester.harvest(target_account, needed - len(queue), exclude=queued_ids))
+            except Exception as e:
+                logger.error(f"Could not harvest followers for {target_account}: {e}")
+        return queue
 
     def send_initial_message(self, user, target_account):
-        """Sends the initial outreach message to a user and logs it to the database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Check if user has already been contacted
-        cursor.execute("SELECT user_id FROM leads WHERE user_id = ?", (user.pk,))
-        if cursor.fetchone():
-            logger.info(f"User {user.username} has already been contacted. Skipping.")
-            conn.close()
-            return False
+        """Sends the initial outreach message to a user and logs it to the database.
 
+        Callers are expected to pass users taken from next_candidates, which only queues followers the
+        harvester found missing from the leads database.
+        """
         try:
             template = random.choice(INITIAL_MESSAGE_TEMPLATES)
             message = template.format(full_name=user.full_name or user.username, target_account=target_account)
-            self.client.direct_send(message, user_ids=[user.pk])
+            dm = self.client.direct_send(message, user_ids=[user.pk])
             
             # Log to database
-            cursor.execute(
-                "INSERT INTO leads (user_id, username, full_name, status) VALUES (?, ?, ?, ?)",
-                (user.pk, user.username, user.full_name, 'contacted')
-            )
-            conn.commit()
+            self.store.record_initial_send(user.pk, user.username, user.full_name, message, getattr(dm, 'id', None))
             logger.info(f"Successfully sent initial message to {user.username}.")
             return True
         except Exception as e:
             logger.error(f"Failed to send message to {user.username}: {e}")
             return False
-        finally:
-            conn.close()
 
     def monitor_and_process_replies(self):
-        """Monitors DM threads for replies from contacted leads and updates the database."""
+        """Monitors DM threads for replies from contacted leads and answers them through the reply pipeline."""
         logger.info("Checking for new replies...")
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
 
         try:
             # Get leads that we are waiting for a reply from
-            cursor.execute("SELECT user_id, username FROM leads WHERE status = 'contacted'")
-            contacted_leads = cursor.fetchall()
+            contacted_leads = self.store.leads_with_status('contacted')
             contacted_user_ids = {lead[0] for lead in contacted_leads}
 
             if not contacted_user_ids:
                 logger.info("No pending leads to check for replies.")
                 return
 
-            # Fetch recent DM threads
-            threads = self.client.direct_threads(amount=50) # Increased amount
+            # Fetch recent DM threads. The inbox listing already carries the latest messages of each
+            # thread, which is usually enough to see what changed since the last sync.
+            threads = self.client.direct_threads(amount=50, thread_message_limit=INBOX_MESSAGE_LIMIT)
+            watermarks = self.store.thread_watermarks(thread.id for thread in threads)
             
+            jobs = []
             for thread in threads:
                 # Check if any participant in the thread is a contacted lead
                 thread_user_ids = {str(user.pk) for user in thread.users}
@@ -232,131 +296,212 @@ class InstagramAppointmentSetter:
 
                 if lead_in_thread:
                     lead_id = lead_in_thread.pop()
-                    
-                    # Fetch the full thread to get messages
-                    full_thread = self.client.direct_thread(thread.id)
-                    if not full_thread or not full_thread.messages:
-                        continue
-
-                    last_message = full_thread.messages[0] # Messages are sorted newest to oldest
-                    
-                    logger.debug(f"Thread with {lead_id}. Last message from user_id: {last_message.user_id}. My user_id: {self.my_user_id}")
-                    # A simple check: if the last message is not from us, it's a reply
-                    if str(last_message.user_id) != str(self.my_user_id):
-                        logger.info(f"Detected a reply from user_id: {lead_id} (username: {thread.users[0].username})")
-                        
-                        # Update lead status and save conversation
-                        conversation_history = f"LEAD: {last_message.text}\n"
-                        cursor.execute(
-                            "UPDATE leads SET status = 'replied', conversation_history = ?, last_contacted_at = CURRENT_TIMESTAMP WHERE user_id = ?",
-                            (conversation_history, lead_id)
-                        )
-                        conn.commit()
-                        logger.info(f"Updated lead {lead_id} to 'replied' status.")
-                        
-                        # Generate and send an intelligent reply
-                        self.generate_and_send_reply(lead_id, conversation_history)
+
+                    # Skip threads that have not changed since the last sync
+                    last_activity_at = str(thread.last_activity_at)
+                    synced_activity_at, last_seen_message_id = watermarks.get(str(thread.id), (None, None))
+                    if last_activity_at != synced_activity_at:
+                        jobs.append((thread, lead_id, last_activity_at, last_seen_message_id))
+
+            self.reply_pipeline.run(jobs)
 
         except Exception as e:
             logger.error(f"An error occurred while monitoring replies: {e}")
-        finally:
-            conn.close()
 
-    def generate_and_send_reply(self, user_id, conversation_history):
-        """Generates a reply using the LLM and sends it to the user."""
+    def _collect_reply(self, job):
+        """Pipeline fetch stage: stores the new messages of a changed thread and returns a reply to
+        answer, (lead_id, thread_id, last_activity_at, last_seen_message_id), if the lead replied.
+
+        The thread watermark is only advanced here when there is nothing to answer; otherwise it moves
+        once the reply has been sent.
+        """
+        thread, lead_id, last_activity_at, last_seen_message_id = job
+        new_messages = self._messages_since(thread, last_seen_message_id)
+        if not new_messages:
+            self.store.save_thread_watermark(thread.id, last_activity_at, last_seen_message_id)
+            return None
+        last_seen_message_id = str(new_messages[0].id)
+
+        # Save conversation, oldest first (already stored messages are ignored, so a retry is harmless)
+        self.store.append_messages(lead_id, [
+            (
+                'agent' if str(message.user_id) == str(self.my_user_id) else 'lead',
+                message.text or f"[{message.item_type}]",
+                message.id,
+            )
+            for message in reversed(new_messages)
+        ])
+
+        last_message = new_messages[0] # Messages are sorted newest to oldest
+
+        logger.debug(f"Thread with {lead_id}. Last message from user_id: {last_message.user_id}. My user_id: {self.my_user_id}")
+        # A simple check: if the last message is not from us, it's a reply
+        if str(last_message.user_id) == str(self.my_user_id):
+            self.store.save_thread_watermark(thread.id, last_activity_at, last_seen_message_id)
+            return None
+        logger.info(f"Detected a reply from user_id: {lead_id} (username: {thread.users[0].username})")
+        return lead_id, thread.id, last_activity_at, last_seen_message_id
+
+    def _generate_for(self, reply):
+        """Pipeline generate stage."""
+        return self.generate_reply(reply[0])
+
+    def _send_and_settle(self, reply, reply_text):
+        """Pipeline send stage: answers the lead, then marks it replied and advances the thread watermark.
+
+        Until the reply is out the lead stays 'contacted' and the watermark stays put, so a reply that
+        could not be generated or sent (e.g. while the account is rate limited) is retried on the next
+        reply check.
+        """
+        lead_id, thread_id, last_activity_at, last_seen_message_id = reply
+        self.send_reply(lead_id, reply_text)
+        self.store.mark_replied(lead_id)
+        self.store.save_thread_watermark(thread_id, last_activity_at, last_seen_message_id)
+        logger.info(f"Updated lead {lead_id} to 'replied' status.")
+
+    def _messages_since(self, thread, last_seen_message_id):
+        """Returns the messages of a thread newer than the watermark, newest first.
+
+        The thread is only fetched again when the watermark is not among the messages that came with
+        the inbox listing.
+        """
+        def take_newer(messages):
+            newer = []
+            for message in messages:
+                if str(message.id) == last_seen_message_id:
+                    return newer
+                newer.append(message)
+            return None if last_seen_message_id else newer
+
+        newer = take_newer(thread.messages or [])
+        if newer:
+            return newer
+        if newer is not None and thread.messages:
+            return []
+        messages = self.client.direct_messages(thread.id, THREAD_FETCH_LIMIT)
+        newer = take_newer(messages)
+        # Watermark older than everything fetched: treat the fetched page as new
+        return messages if newer is None else newer
+
+    def generate_reply(self, user_id):
+        """Generates a reply using the LLM. Returns None if the model is unavailable or the call fails."""
         if not self.model:
             logger.warning("Cannot generate reply: LLM model not initialized.")
-            return
+            return None
 
         logger.info(f"Generating reply for user_id: {user_id}")
         
-        # Construct the prompt for the LLM
-        full_prompt = (
-            f"{SYSTEM_PROMPT}\n\n"
-            f"**Contexto de Venezuela:**\n{VENEZUELA_CONTEXT}\n\n"
-            f"**Base de Conocimiento de Productos:**\n{ECOFLOW_KNOWLEDGE_BASE}\n\n"
-            f"**Metodología de Ventas:**\n{SALES_METHODOLOGY}\n\n"
-            f"**Historial de la Conversación:**\n{conversation_history}\n\n"
-            "**Tu Tarea:** Responde al último mensaje del lead de manera empática y consultiva. "
-            "Usa tu conocimiento para guiar la conversación, identificar sus necesidades y acercarlo a una solución. "
-            "Si te piden precios, usa la base de conocimiento. Si hacen preguntas técnicas, respóndelas. "
-            "Tu objetivo es calificar al lead. No termines la conversación, siempre haz una pregunta abierta para continuar."
-            "\n\n**Tu Respuesta (como Alejandro Rojas):**"
+        # Only the conversation goes in the request; the persona, knowledge base and task are in the
+        # system instruction
+        turns = [f"{ROLE_LABELS.get(role, role.upper())}: {text}" for role, text in self.store.recent_messages(user_id)]
+        history = conversation_window(turns)
+        prompt = (
+            f"**Historial de la Conversación:**\n{history}\n\n"
+            "**Tu Respuesta (como Alejandro Rojas):**"
         )
 
         try:
-            response = self.model.generate_content(full_prompt)
-            reply_text = response.text
+            response = self.model.generate_content(prompt)
+            return response.text
+        except Exception as e:
+            logger.error(f"Failed to generate reply for {user_id}: {e}")
+            return None
 
+    def send_reply(self, user_id, reply_text):
+        """Sends a generated reply and appends it to the stored conversation. Raises if the send fails."""
+        try:
             # Send the reply via Instagram DM
-            self.client.direct_send(reply_text, user_ids=[user_id])
+            dm = self.client.direct_send(reply_text, user_ids=[user_id])
             logger.info(f"Successfully sent reply to {user_id}: {reply_text}")
 
             # Update conversation history in the database
-            updated_history = f"{conversation_history}ALEJANDRO: {reply_text}\n"
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE leads SET conversation_history = ? WHERE user_id = ?",
-                (updated_history, user_id)
-            )
-            conn.commit()
-            conn.close()
+            self.store.append_messages(user_id, [('agent', reply_text, getattr(dm, 'id', None))])
 
         except Exception as e:
-            logger.error(f"Failed to generate or send reply for {user_id}: {e}")
-
-    def run(self, target_account="ecoflowpower_ve", daily_limit=30, check_interval_minutes=30):
-        """Main loop for the agent. Sends outreach messages and checks for replies."""
+            logger.error(f"Failed to send reply for {user_id}: {e}")
+            raise
+
+    def start_session(self, target_account="ecoflowpower_ve", daily_limit=30, check_interval_minutes=30,
+                      active_hours=DEFAULT_ACTIVE_HOURS, reply_check_seconds=REPLY_CHECK_SECONDS):
+        """Configures the outreach session that step() works through."""
+        self.target_account = target_account
+        self.daily_limit = daily_limit
+        self.check_interval_minutes = check_interval_minutes
+        self.reply_check_seconds = reply_check_seconds
+        self.scheduler = SendScheduler(daily_limit, active_hours=active_hours)
+        self._next_reply_check = 0.0
+        self._next_harvest_at = 0.0
+
+    def step(self):
+        """Runs the next unit of work and returns how many seconds the caller may sleep before calling again.
+
+        Reply checks run on their own interval and always come first. Outreach sends are taken one at
+        a time from the send scheduler, so a pending send never delays a reply check.
+        """
+        if self.stop_requested.is_set():
+            return 0.0
+        now = time.monotonic()
+
+        # 0. While Instagram is rate limiting the account, make no calls at all until the pause is over.
+        retry_after = self.throttle.retry_after()
+        if retry_after > 0:
+            logger.debug(f"Instagram calls paused for {retry_after:.0f} more seconds.")
+            return retry_after
+
+        # 1. Always check for replies first. This is the priority.
+        if now >= self._next_reply_check:
+            self.monitor_and_process_replies()
+            self._next_reply_check = time.monotonic() + self.reply_check_seconds
+            now = time.monotonic()
+
+        until_reply_check = max(0.0, self._next_reply_check - now)
+
+        # 2. Check how many messages have been sent today.
+        messages_sent_today = self.store.sends_today()
+        if messages_sent_today >= self.daily_limit:
+            logger.debug("Daily message limit reached. Reply-monitoring only until tomorrow.")
+            return until_reply_check
+
+        # 3. Send one outreach message if the scheduler has a slot and there is someone to contact.
+        until_send = self.scheduler.seconds_until_next()
+        if until_send > 0:
+            return min(until_reply_check, until_send)
+
+        if now < self._next_harvest_at and not self._candidate_queues.get(self.target_account):
+            return min(until_reply_check, self._next_harvest_at - now)
+
+        followers = self.next_candidates(self.target_account, self.daily_limit - messages_sent_today)
+        if not followers:
+            logger.warning(f"No new followers found for outreach. Retrying in {self.check_interval_minutes} minutes.")
+            self._next_harvest_at = now + self.check_interval_minutes * 60
+            return until_reply_check
+
+        if self.scheduler.try_acquire():
+            follower = followers.popleft()
+            if self.send_initial_message(follower, self.target_account):
+                logger.info(f"Messages sent today: {messages_sent_today + 1}. Daily limit: {self.daily_limit}.")
+            elif self.throttle.retry_after() > 0:
+                # Rejected because of rate limiting, not because of the user: contact them after the pause
+                followers.appendleft(follower)
+        return min(until_reply_check, self.scheduler.seconds_until_next())
+
+    def run(self, target_account="ecoflowpower_ve", daily_limit=30, check_interval_minutes=30,
+            active_hours=DEFAULT_ACTIVE_HOURS, reply_check_seconds=REPLY_CHECK_SECONDS):
+        """Main loop for the agent. Sends outreach messages and checks for replies.
+
+        Outreach is spread over `active_hours` (local start and end hour) by the send scheduler.
+        Replies are checked every `reply_check_seconds`. When the target has no new followers, the
+        next harvest waits `check_interval_minutes`.
+        """
         logger.info("Agent started.")
         self.login()
-        
-        while True:
-            # --- Dynamic Outreach and Monitoring Cycle ---
-            logger.info("Starting new dynamic cycle...")
-
-            # 1. Always check for replies first. This is the priority.
-            self.monitor_and_process_replies()
-
-            # 2. Check how many messages have been sent today.
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM leads WHERE DATE(last_contacted_at) = DATE('now', 'localtime')")
-            messages_sent_today = cursor.fetchone()[0]
-            conn.close()
-            logger.info(f"Messages sent today: {messages_sent_today}. Daily limit: {daily_limit}.")
-
-            # 3. If the daily limit has not been reached, proceed with sending new messages.
-            if messages_sent_today < daily_limit:
-                logger.info("Daily limit not reached. Proceeding with outreach.")
-                followers = self.get_followers(target_account, amount=daily_limit * 2)
-                
-                if not followers:
-                    logger.warning("No new followers found for outreach.")
-                else:
-                    for follower in followers:
-                        # Re-check the count before each send
-                        conn = sqlite3.connect(self.db_path)
-                        cursor = conn.cursor()
-                        cursor.execute("SELECT COUNT(*) FROM leads WHERE DATE(last_contacted_at) = DATE('now', 'localtime')")
-                        messages_sent_today = cursor.fetchone()[0]
-                        conn.close()
-
-                        if messages_sent_today >= daily_limit:
-                            logger.info("Daily message limit reached during outreach cycle.")
-                            break
-                        
-                        if self.send_initial_message(follower, target_account):
-                            delay = random.uniform(90, 120) # Keep safe delay
-                            logger.info(f"Waiting for {delay:.2f} seconds...")
-                            time.sleep(delay)
-            else:
-                logger.info("Daily message limit reached. Switching to reply-monitoring only mode.")
+        self.start_session(target_account, daily_limit, check_interval_minutes, active_hours, reply_check_seconds)
 
-            # 4. Wait for the next cycle.
-            final_wait_minutes = 5 if messages_sent_today >= daily_limit else check_interval_minutes
-            logger.info(f"Cycle finished. Waiting for {final_wait_minutes} minutes...")
-            time.sleep(final_wait_minutes * 60)
+        while not self.stop_requested.is_set():
+            delay = max(MIN_STEP_SECONDS, self.step())
+            logger.debug(f"Sleeping {delay:.1f} seconds until the next reply check or send slot.")
+            self.stop_requested.wait(delay)
+        logger.info("Agent stopped.")
 
 
 if __name__ == "__main__":
@@ -364,6 +509,8 @@ if __name__ == "__main__":
     ig_password = os.getenv("INSTAGRAM_PASSWORD")
     ig_2fa_code = os.getenv("INSTAGRAM_VERIFICATION_CODE")
     api_key = os.getenv("API_KEY")
+    # Active hours as "START-END" in local time, e.g. "9-21"
+    active_hours = tuple(int(hour) for hour in os.getenv("AGENT_ACTIVE_HOURS", "9-21").split("-"))
 
     if not ig_username or not ig_password:
         logger.error("Instagram credentials not found in .env file.")
@@ -376,4 +523,4 @@ if __name__ == "__main__":
         verification_code=ig_2fa_code,
         api_key=api_key
     )
-    agent.run()
+    agent.run(active_hours=active_hours)
@@ -0,0 +1,120 @@
+import threading
+import time
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def session_file(account, session_dir="."):
+    """Path of the instagrapi settings file an account's session is kept in."""
+    return Path(session_dir) / f"{account}_session.json"
+
+
+class _PooledClient:
+    def __init__(self, client):
+        self.client = client
+        self.last_used = time.monotonic()
+
+
+class ClientPool:
+    """Logged-in Instagram clients for several accounts in one process.
+
+    A client is created the first time a tool acts as its account, from the account's
+    <account>_session.json and the password known for it. Clients idle for longer than
+    `idle_seconds` are dropped after their session is saved back to disk, and created again from it
+    on the next call. The default account is never evicted.
+
+    `login(account, password, session_path)` must return a ready instagrapi Client; password may be
+    None for accounts that only have a session file.
+    """
+
+    def __init__(self, login, passwords=None, session_dir=".", idle_seconds=1800):
+        self.login = login
+        self.passwords = dict(passwords or {})
+        self.session_dir = session_dir
+        self.idle_seconds = idle_seconds
+        self.default_account = None
+        self._clients = {}
+        self._login_locks = {}
+        self._lock = threading.Lock()
+        self.logins = 0
+        self.evictions = 0
+
+    def add(self, account, client, default=False):
+        """Registers a client that is already logged in (e.g. the account the server was started with)."""
+        with self._lock:
+            self._clients[account] = _PooledClient(client)
+            if default or self.default_account is None:
+                self.default_account = account
+
+    def set_default(self, account, password=None):
+        """Makes `account` the default account without logging in; its client is created on first use."""
+        account = account.lstrip("@")
+        with self._lock:
+            self.default_account = account
+            if password:
+                self.passwords[account] = password
+
+    def _login_lock(self, account):
+        with self._lock:
+            return self._login_locks.setdefault(account, threading.Lock())
+
+    def _login(self, account):
+        path = session_file(account, self.session_dir)
+        password = self.passwords.get(account)
+        if not path.exists() and not password:
+            raise ValueError(f"No session file ({path}) or password configured for account '{account}'.")
+        return self.login(account, password, path)
+
+    def get(self, account=None):
+        """Returns the client of an account (the default account if None), logging in on first use."""
+        account = (account or self.default_account or "").lstrip("@")
+        if not account:
+            raise ValueError("No account given and no default account is logged in.")
+        self.evict_idle()
+        with self._lock:
+            entry = self._clients.get(account)
+            if entry is not None:
+                entry.last_used = time.monotonic()
+                return entry.client
+
+        # One login per account, even if several tool calls arrive at once
+        with self._login_lock(account):
+            with self._lock:
+                entry = self._clients.get(account)
+            if entry is None:
+                client = self._login(account)
+                with self._lock:
+                    entry = self._clients[account] = _PooledClient(client)
+                    self.logins += 1
+            entry.last_used = time.monotonic()
+            return entry.client
+
+    def evict_idle(self):
+        """Drops clients that have not been used for idle_seconds, saving their sessions first."""
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            idle = [
+                (account, entry) for account, entry in self._clients.items()
+                if entry.last_used < cutoff and account != self.default_account
+            ]
+            for account, _ in idle:
+                del self._clients[account]
+            self.evictions += len(idle)
+        for account, entry in idle:
+            try:
+                entry.client.dump_settings(session_file(account, self.session_dir))
+            except Exception as e:
+                logger.warning(f"Could not save the session of {account}: {e}")
+            logger.info(f"Evicted idle Instagram client for {account}")
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "default_account": self.default_account,
+                "logged_in": {account: round(now - entry.last_used) for account, entry in self._clients.items()},
+                "logins": self.logins,
+                "evictions": self.evictions,
+            }
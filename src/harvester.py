@@ -0,0 +1,65 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FollowerHarvester:
+    """Pulls a target account's followers page by page, resuming where the last harvest stopped.
+
+    The pagination cursor for each target is stored in the lead database, so consecutive cycles (and
+    agent restarts) walk further down the follower list instead of re-reading the first pages. When
+    the end of the list is reached the cursor wraps back to the top to pick up new followers.
+    """
+
+    def __init__(self, client, store, chunk_size=100, max_chunks=10):
+        self.client = client
+        self.store = store
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+
+    def harvest(self, target_username, needed, exclude=()):
+        """Returns up to a few chunks' worth of uncontacted followers, stopping once `needed` are found.
+
+        Every fresh follower of a fetched chunk is returned, even past `needed`, because the stored
+        cursor has already moved beyond them. For the same reason, if a later chunk fails (e.g. the
+        account is rate limited), the candidates found so far are returned instead of the error.
+        `exclude` holds user ids the caller is already queueing.
+        """
+        frontier = self.store.get_frontier(target_username)
+        if frontier:
+            target_user_id, cursor = frontier
+        else:
+            target_user_id = str(self.client.user_id_from_username(target_username))
+            cursor = ''
+
+        seen = {str(user_id) for user_id in exclude}
+        candidates = []
+        for _ in range(self.max_chunks):
+            try:
+                users, next_cursor = self.client.user_followers_v1_chunk(
+                    target_user_id, max_amount=self.chunk_size, max_id=cursor
+                )
+            except Exception as e:
+                if not candidates:
+                    raise
+                logger.warning(f"Stopped harvesting {target_username} early: {e}")
+                break
+            fresh_ids = set(self.store.filter_uncontacted(user.pk for user in users))
+            for user in users:
+                user_id = str(user.pk)
+                if user_id in fresh_ids and user_id not in seen:
+                    seen.add(user_id)
+                    candidates.append(user)
+
+            cursor = next_cursor or ''
+            self.store.save_frontier(target_username, target_user_id, cursor)
+            logger.info(
+                f"Harvested {len(users)} followers of {target_username}; "
+                f"{len(candidates)} new candidates so far."
+            )
+            if not next_cursor:
+                logger.info(f"Reached the end of {target_username}'s followers. Next harvest starts from the top.")
+                break
+            if len(candidates) >= needed:
+                break
+        return candidates
@@ -0,0 +1,371 @@
+import json
+import sqlite3
+import threading
+import time
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    title TEXT,
+    last_activity_at REAL, -- unix time of the newest activity Instagram reported
+    payload TEXT NOT NULL, -- thread JSON without its messages
+    synced_at REAL NOT NULL, -- last time the mirrored messages were known to be current
+    messages_complete INTEGER NOT NULL DEFAULT 0 -- 1 once the oldest message of the thread is mirrored
+);
+CREATE INDEX IF NOT EXISTS idx_threads_last_activity_at ON threads (last_activity_at DESC);
+CREATE TABLE IF NOT EXISTS participants (
+    thread_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    username TEXT,
+    full_name TEXT,
+    PRIMARY KEY (thread_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_participants_username ON participants (username);
+CREATE TABLE IF NOT EXISTS messages (
+    thread_id TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    timestamp REAL,
+    payload TEXT NOT NULL, -- message JSON
+    PRIMARY KEY (thread_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS idx_messages_thread_timestamp ON messages (thread_id, timestamp DESC);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+SQL_UPSERT_THREAD = (
+    "INSERT INTO threads (thread_id, title, last_activity_at, payload, synced_at) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(thread_id) DO UPDATE SET title = excluded.title, last_activity_at = excluded.last_activity_at, "
+    "payload = excluded.payload, synced_at = excluded.synced_at"
+)
+SQL_THREAD_ACTIVITY = "SELECT last_activity_at FROM threads WHERE thread_id = ?"
+SQL_THREAD_ROW = "SELECT payload, synced_at, messages_complete FROM threads WHERE thread_id = ?"
+SQL_THREAD_PAGE = "SELECT thread_id, payload FROM threads ORDER BY last_activity_at DESC LIMIT ? OFFSET ?"
+SQL_COUNT_THREADS = "SELECT COUNT(*) FROM threads"
+SQL_UPDATE_PAYLOAD = "UPDATE threads SET payload = ? WHERE thread_id = ?"
+SQL_TOUCH_THREAD = "UPDATE threads SET synced_at = ? WHERE thread_id = ?"
+SQL_TOUCH_ALL_THREADS = "UPDATE threads SET synced_at = ?"
+SQL_SET_COMPLETE = "UPDATE threads SET messages_complete = ? WHERE thread_id = ?"
+SQL_BUMP_ACTIVITY = "UPDATE threads SET last_activity_at = MAX(COALESCE(last_activity_at, 0), ?) WHERE thread_id = ?"
+SQL_DELETE_PARTICIPANTS = "DELETE FROM participants WHERE thread_id = ?"
+SQL_INSERT_PARTICIPANT = "INSERT OR REPLACE INTO participants (thread_id, user_id, username, full_name) VALUES (?, ?, ?, ?)"
+SQL_UPSERT_MESSAGE = "INSERT OR REPLACE INTO messages (thread_id, message_id, timestamp, payload) VALUES (?, ?, ?, ?)"
+SQL_DELETE_MESSAGE = "DELETE FROM messages WHERE thread_id = ? AND message_id = ?"
+SQL_DELETE_OLDER_MESSAGES = "DELETE FROM messages WHERE thread_id = ? AND timestamp < ?"
+SQL_NEWEST_MESSAGE = "SELECT message_id, timestamp FROM messages WHERE thread_id = ? ORDER BY timestamp DESC LIMIT 1"
+SQL_THREAD_MESSAGES = "SELECT payload FROM messages WHERE thread_id = ? ORDER BY timestamp DESC LIMIT ?"
+# Newest `limit` messages of several threads in one statement
+SQL_LATEST_MESSAGES = (
+    "SELECT thread_id, payload FROM ("
+    "SELECT thread_id, payload, ROW_NUMBER() OVER (PARTITION BY thread_id ORDER BY timestamp DESC) AS rank "
+    "FROM messages WHERE thread_id IN ({placeholders})"
+    ") WHERE rank <= ? ORDER BY thread_id, rank"
+)
+SQL_SEARCH_THREADS = (
+    "SELECT DISTINCT t.thread_id, t.payload FROM threads t "
+    "LEFT JOIN participants p ON p.thread_id = t.thread_id "
+    "WHERE t.title LIKE :q ESCAPE '\\' OR p.username LIKE :q ESCAPE '\\' OR p.full_name LIKE :q ESCAPE '\\' "
+    "ORDER BY t.last_activity_at DESC LIMIT :limit"
+)
+SQL_GET_STATE = "SELECT value FROM sync_state WHERE key = ?"
+SQL_SET_STATE = "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)"
+
+
+def to_unix(value):
+    """Converts an ISO timestamp (as dumped by pydantic), datetime or number to unix time."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return value.timestamp()
+
+
+class InboxMirror:
+    """Local SQLite copy of the DM inbox: threads, their participants and their messages.
+
+    Threads and messages are stored as the JSON the live tools would have returned, so a read served
+    from the mirror has the same shape as one served by Instagram. Each thread remembers when its
+    messages were last confirmed current; readers pass a max age and get None back when the mirror
+    cannot answer within it, which tells them to go to Instagram instead.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=256)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ---------------------------------------------------------------------------------------------
+    # Sync state
+    # ---------------------------------------------------------------------------------------------
+
+    def _get_state(self, key):
+        row = self._conn.execute(SQL_GET_STATE, (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key, value):
+        self._conn.execute(SQL_SET_STATE, (key, value))
+
+    def inbox_age(self):
+        """Seconds since the syncer last finished a pass over the inbox, or None if it never did."""
+        with self._lock:
+            synced_at = self._get_state("inbox_synced_at")
+        return time.time() - float(synced_at) if synced_at else None
+
+    def inbox_tail(self):
+        """Returns (complete, cursor): whether the whole inbox is mirrored, else the inbox cursor after the last mirrored thread."""
+        with self._lock:
+            return self._get_state("inbox_complete") == "1", self._get_state("inbox_tail_cursor")
+
+    def finish_pass(self, complete, tail_cursor):
+        with self._lock, self._conn:
+            self._set_state("inbox_synced_at", str(time.time()))
+            self._set_state("inbox_complete", "1" if complete else "0")
+            self._set_state("inbox_tail_cursor", tail_cursor)
+
+    # ---------------------------------------------------------------------------------------------
+    # Writes
+    # ---------------------------------------------------------------------------------------------
+
+    def thread_activity(self, thread_id):
+        """Returns the mirrored last_activity_at of a thread, or None if it is not mirrored."""
+        with self._lock:
+            row = self._conn.execute(SQL_THREAD_ACTIVITY, (str(thread_id),)).fetchone()
+        return row[0] if row else None
+
+    def newest_message(self, thread_id):
+        """Returns (message_id, timestamp) of the newest mirrored message of a thread, or None."""
+        with self._lock:
+            return self._conn.execute(SQL_NEWEST_MESSAGE, (str(thread_id),)).fetchone()
+
+    def save_thread(self, thread, synced_at=None):
+        """Stores a thread dict along with its participants; its messages are stored with save_messages."""
+        thread_id = str(thread["id"])
+        payload = {k: v for k, v in thread.items() if k != "messages"}
+        with self._lock, self._conn:
+            self._conn.execute(SQL_UPSERT_THREAD, (
+                thread_id,
+                thread.get("thread_title"),
+                to_unix(thread.get("last_activity_at")),
+                json.dumps(payload, default=str),
+                synced_at or time.time(),
+            ))
+            self._conn.execute(SQL_DELETE_PARTICIPANTS, (thread_id,))
+            self._conn.executemany(SQL_INSERT_PARTICIPANT, [
+                (thread_id, str(user.get("pk")), user.get("username"), user.get("full_name"))
+                for user in thread.get("users") or []
+            ])
+
+    def _save_messages(self, thread_id, messages):
+        self._conn.executemany(SQL_UPSERT_MESSAGE, [
+            (thread_id, str(m["id"]), to_unix(m.get("timestamp")), json.dumps(m, default=str))
+            for m in messages
+        ])
+
+    def save_messages(self, thread_id, messages, complete=None, drop_older=False):
+        """Stores message dicts of a thread.
+
+        With drop_older the thread's mirrored messages older than the oldest given one are deleted,
+        for when the syncer could not reach them and would otherwise leave a gap.
+        """
+        thread_id = str(thread_id)
+        with self._lock, self._conn:
+            self._save_messages(thread_id, messages)
+            if drop_older and messages:
+                oldest = min(to_unix(m.get("timestamp")) or 0 for m in messages)
+                self._conn.execute(SQL_DELETE_OLDER_MESSAGES, (thread_id, oldest))
+            if complete is not None:
+                self._conn.execute(SQL_SET_COMPLETE, (1 if complete else 0, thread_id))
+
+    def record_sent(self, message):
+        """Adds a message the server just sent, so reads see it without waiting for the syncer."""
+        thread_id = message.get("thread_id")
+        if not thread_id or not message.get("id"):
+            return
+        with self._lock, self._conn:
+            self._save_messages(str(thread_id), [message])
+            self._conn.execute(SQL_BUMP_ACTIVITY, (to_unix(message.get("timestamp")) or time.time(), str(thread_id)))
+
+    def delete_message(self, thread_id, message_id):
+        with self._lock, self._conn:
+            self._conn.execute(SQL_DELETE_MESSAGE, (str(thread_id), str(message_id)))
+
+    def update_thread(self, thread_id, **fields):
+        """Overwrites fields of a mirrored thread's payload (e.g. muted=True)."""
+        thread_id = str(thread_id)
+        with self._lock, self._conn:
+            row = self._conn.execute(SQL_THREAD_ROW, (thread_id,)).fetchone()
+            if row is None:
+                return
+            payload = json.loads(row[0])
+            payload.update(fields)
+            self._conn.execute(SQL_UPDATE_PAYLOAD, (json.dumps(payload, default=str), thread_id))
+
+    def touch(self, thread_id=None, synced_at=None):
+        """Marks one thread (or every thread) as confirmed current."""
+        with self._lock, self._conn:
+            if thread_id is None:
+                self._conn.execute(SQL_TOUCH_ALL_THREADS, (synced_at or time.time(),))
+            else:
+                self._conn.execute(SQL_TOUCH_THREAD, (synced_at or time.time(), str(thread_id)))
+
+    # ---------------------------------------------------------------------------------------------
+    # Reads
+    # ---------------------------------------------------------------------------------------------
+
+    def _with_messages(self, rows, message_limit):
+        threads = [json.loads(payload) for _, payload in rows]
+        if not threads or not message_limit:
+            return threads
+        by_id = {str(t["id"]): t for t in threads}
+        for thread in threads:
+            thread["messages"] = []
+        ids = list(by_id)
+        sql = SQL_LATEST_MESSAGES.format(placeholders=",".join("?" * len(ids)))
+        with self._lock:
+            for thread_id, payload in self._conn.execute(sql, (*ids, message_limit)):
+                by_id[thread_id]["messages"].append(json.loads(payload))
+        return threads
+
+    def count_threads(self):
+        with self._lock:
+            return self._conn.execute(SQL_COUNT_THREADS).fetchone()[0]
+
+    def threads(self, offset, limit, message_limit=20):
+        """Returns mirrored threads in inbox order (most recent activity first), each with its newest messages."""
+        with self._lock:
+            rows = self._conn.execute(SQL_THREAD_PAGE, (limit, offset)).fetchall()
+        return self._with_messages(rows, message_limit)
+
+    def messages(self, thread_id, amount, max_age):
+        """Returns the newest `amount` messages of a thread, or None if the mirror cannot answer within max_age."""
+        thread_id = str(thread_id)
+        with self._lock:
+            row = self._conn.execute(SQL_THREAD_ROW, (thread_id,)).fetchone()
+            if row is None or time.time() - row[1] > max_age:
+                return None
+            messages = [json.loads(p) for (p,) in self._conn.execute(SQL_THREAD_MESSAGES, (thread_id, amount))]
+        if len(messages) < amount and not row[2]:
+            return None  # Older messages were never mirrored
+        return messages
+
+    def thread(self, thread_id, amount, max_age):
+        """Returns a thread with its newest `amount` messages, or None if the mirror cannot answer within max_age."""
+        messages = self.messages(thread_id, amount, max_age)
+        if messages is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(SQL_THREAD_ROW, (str(thread_id),)).fetchone()
+        if row is None:
+            return None
+        thread = json.loads(row[0])
+        thread["messages"] = messages
+        return thread
+
+    def search(self, query, limit=20):
+        """Returns mirrored threads whose title, participant username or full name contains query."""
+        escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        with self._lock:
+            rows = self._conn.execute(SQL_SEARCH_THREADS, {"q": f"%{escaped}%", "limit": limit}).fetchall()
+        return [json.loads(payload) for _, payload in rows]
+
+
+class InboxSyncer:
+    """Background thread that keeps an InboxMirror in step with Instagram.
+
+    Every `interval` seconds it walks the inbox from the top. Threads whose last activity did not
+    change are only marked as current; changed threads get their new messages, paging further back
+    when more arrived than the inbox page carries. Since the inbox is ordered by last activity, a
+    page in which nothing changed means nothing further down changed either, so the pass stops there.
+
+    `fetch_inbox_page(cursor)` returns (thread dicts, next cursor or None); `fetch_message_page(thread_id,
+    cursor)` returns (message dicts newest first, next older cursor or None).
+    """
+
+    def __init__(self, mirror, fetch_inbox_page, fetch_message_page, interval=30, max_threads=200, max_catchup_pages=10):
+        self.mirror = mirror
+        self.fetch_inbox_page = fetch_inbox_page
+        self.fetch_message_page = fetch_message_page
+        self.interval = interval
+        self.max_threads = max_threads
+        self.max_catchup_pages = max_catchup_pages
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="inbox-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.sync_once()
+            except Exception as e:
+                logger.error(f"Inbox sync failed: {e}")
+            self._stop.wait(self.interval)
+
+    def _catch_up(self, thread_id, messages):
+        """Stores a changed thread's new messages, paging back to the newest mirrored one so none are skipped."""
+        newest = self.mirror.newest_message(thread_id)
+        if newest is None or any(str(m["id"]) == newest[0] for m in messages):
+            self.mirror.save_messages(thread_id, messages)
+            return
+        fetched, cursor = [], None
+        for _ in range(self.max_catchup_pages):
+            page, cursor = self.fetch_message_page(thread_id, cursor)
+            fetched.extend(page)
+            if not page or cursor is None or any(str(m["id"]) == newest[0] for m in page):
+                self.mirror.save_messages(thread_id, fetched, complete=True if cursor is None else None)
+                return
+        # Too far behind: keep only what was fetched rather than leave a hole in the thread
+        self.mirror.save_messages(thread_id, fetched, complete=False, drop_older=True)
+
+    def sync_once(self):
+        started = time.time()
+        cursor = None
+        seen = 0
+        while True:
+            threads, next_cursor = self.fetch_inbox_page(cursor)
+            changed = 0
+            for thread in threads:
+                thread_id = str(thread["id"])
+                known_activity = self.mirror.thread_activity(thread_id)
+                if known_activity is not None and known_activity == to_unix(thread.get("last_activity_at")):
+                    self.mirror.touch(thread_id, started)
+                    continue
+                changed += 1
+                # Messages first, so a reader never sees the thread as current before they are stored
+                self._catch_up(thread_id, thread.get("messages") or [])
+                self.mirror.save_thread(thread, synced_at=started)
+            seen += len(threads)
+
+            if threads and not changed:
+                self.mirror.touch(None, started)
+                self.mirror.finish_pass(*self.mirror.inbox_tail())
+                return
+            if not threads or not next_cursor:
+                self.mirror.finish_pass(True, None)
+                return
+            if seen >= self.max_threads:
+                self.mirror.finish_pass(False, next_cursor)
+                return
+            cursor = next_cursor
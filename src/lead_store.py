@@ -0,0 +1,333 @@
+import re
+import sqlite3
+import threading
+import logging
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever a data migration is added to LeadStore._migrate
+SCHEMA_VERSION = 2
+
+# Prefixes used by the legacy conversation_history blob, mapped to message roles
+HISTORY_BLOB_ROLES = (("LEAD:", "lead"), ("ALEJANDRO:", "agent"))
+
+# Stay well below SQLite's default limit of 999 bound parameters per statement.
+IN_CHUNK_SIZE = 500
+
+# Upper bound on one page of conversation search results
+MAX_SEARCH_LIMIT = 100
+
+# =================================================================================================
+# SQL STATEMENTS
+# Kept as module constants so sqlite3's per-connection statement cache reuses the compiled
+# statements instead of re-preparing them on every call.
+# =================================================================================================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leads (
+    user_id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    full_name TEXT,
+    status TEXT DEFAULT 'contacted', -- contacted, replied, qualified, transferred, ignored
+    last_contacted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    conversation_history TEXT -- legacy blob, superseded by the messages table
+);
+CREATE INDEX IF NOT EXISTS idx_leads_status ON leads (status);
+CREATE INDEX IF NOT EXISTS idx_leads_last_contacted_at ON leads (last_contacted_at);
+CREATE TABLE IF NOT EXISTS daily_sends (
+    day TEXT PRIMARY KEY, -- local date, YYYY-MM-DD
+    sent INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS harvest_frontier (
+    target_username TEXT PRIMARY KEY,
+    target_user_id TEXT NOT NULL,
+    next_max_id TEXT NOT NULL DEFAULT '', -- '' means start from the top of the follower list
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS thread_sync (
+    thread_id TEXT PRIMARY KEY,
+    last_activity_at TEXT,
+    last_seen_message_id TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lead_id TEXT NOT NULL,
+    ig_message_id TEXT, -- NULL for turns migrated from the legacy blob
+    role TEXT NOT NULL, -- lead, agent
+    text TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (lead_id, ig_message_id)
+);
+CREATE INDEX IF NOT EXISTS idx_messages_lead_id ON messages (lead_id, id);
+-- Full-text index over message text, kept in step with the messages table by the triggers below.
+-- remove_diacritics lets "nevera" match "nevéra" and vice versa.
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    text, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF text ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    INSERT INTO messages_fts (rowid, text) VALUES (new.id, new.text);
+END;
+"""
+
+SQL_INSERT_LEAD = "INSERT OR IGNORE INTO leads (user_id, username, full_name, status) VALUES (?, ?, ?, ?)"
+SQL_KNOWN_LEADS = "SELECT user_id FROM leads WHERE user_id IN ({placeholders})"
+SQL_LEADS_BY_STATUS = "SELECT user_id, username FROM leads WHERE status = ?"
+SQL_COUNT_BY_STATUS = "SELECT COUNT(*) FROM leads WHERE status = ?"
+SQL_MARK_REPLIED = "UPDATE leads SET status = 'replied', last_contacted_at = CURRENT_TIMESTAMP WHERE user_id = ?"
+SQL_APPEND_MESSAGE = "INSERT OR IGNORE INTO messages (lead_id, ig_message_id, role, text) VALUES (?, ?, ?, ?)"
+SQL_RECENT_MESSAGES = "SELECT role, text FROM messages WHERE lead_id = ? ORDER BY id DESC LIMIT ?"
+SQL_LEGACY_HISTORIES = (
+    "SELECT user_id, conversation_history FROM leads "
+    "WHERE conversation_history IS NOT NULL AND conversation_history != ''"
+)
+SQL_TABLE_EXISTS = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+SQL_SENDS_ON_DAY = "SELECT sent FROM daily_sends WHERE day = ?"
+SQL_INCREMENT_SENDS = (
+    "INSERT INTO daily_sends (day, sent) VALUES (?, 1) "
+    "ON CONFLICT(day) DO UPDATE SET sent = sent + 1"
+)
+SQL_GET_FRONTIER = "SELECT target_user_id, next_max_id FROM harvest_frontier WHERE target_username = ?"
+SQL_SAVE_FRONTIER = (
+    "INSERT INTO harvest_frontier (target_username, target_user_id, next_max_id) VALUES (?, ?, ?) "
+    "ON CONFLICT(target_username) DO UPDATE SET target_user_id = excluded.target_user_id, "
+    "next_max_id = excluded.next_max_id, updated_at = CURRENT_TIMESTAMP"
+)
+SQL_THREAD_WATERMARKS = (
+    "SELECT thread_id, last_activity_at, last_seen_message_id FROM thread_sync WHERE thread_id IN ({placeholders})"
+)
+SQL_SAVE_THREAD_WATERMARK = (
+    "INSERT INTO thread_sync (thread_id, last_activity_at, last_seen_message_id) VALUES (?, ?, ?) "
+    "ON CONFLICT(thread_id) DO UPDATE SET last_activity_at = excluded.last_activity_at, "
+    "last_seen_message_id = excluded.last_seen_message_id, updated_at = CURRENT_TIMESTAMP"
+)
+SQL_REBUILD_FTS = "INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')"
+# Best-ranked matching message of each lead, one page of leads at a time
+SQL_SEARCH_LEADS = (
+    "SELECT hits.id, hits.lead_id, l.username, l.full_name, l.status, hits.role, hits.created_at, hits.rank FROM ("
+    "SELECT *, ROW_NUMBER() OVER (PARTITION BY lead_id ORDER BY rank) AS lead_rank FROM ("
+    "SELECT m.id, m.lead_id, m.role, m.created_at, bm25(messages_fts) AS rank "
+    "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid WHERE messages_fts MATCH ?"
+    ")) hits JOIN leads l ON l.user_id = hits.lead_id "
+    "WHERE hits.lead_rank = 1 AND (? IS NULL OR l.status = ?) "
+    "ORDER BY hits.rank, hits.lead_id LIMIT ? OFFSET ?"
+)
+# Snippets are only built for the page being returned, not for every match
+SQL_SEARCH_SNIPPETS = (
+    "SELECT rowid, snippet(messages_fts, 0, '[', ']', '…', 12) FROM messages_fts "
+    "WHERE messages_fts MATCH ? AND rowid IN ({placeholders})"
+)
+# One-off seed for databases created before the ledger existed, so the daily limit still holds on
+# the day of the upgrade.
+SQL_SEED_SENDS = (
+    "INSERT OR IGNORE INTO daily_sends (day, sent) "
+    "SELECT ?, COUNT(*) FROM leads WHERE DATE(last_contacted_at, 'localtime') = ?"
+)
+
+
+def parse_history_blob(conversation_history):
+    """Splits a legacy 'LEAD: ...' / 'ALEJANDRO: ...' history blob into (role, text) turns."""
+    turns = []
+    for line in conversation_history.splitlines():
+        for prefix, role in HISTORY_BLOB_ROLES:
+            if line.startswith(prefix):
+                turns.append([role, line[len(prefix):].strip()])
+                break
+        else:
+            if turns:
+                turns[-1][1] += "\n" + line
+            elif line.strip():
+                turns.append(["lead", line.strip()])
+    return [(role, text) for role, text in turns]
+
+
+def fts_query(text):
+    """Turns free text into an FTS5 query matching messages that contain every word, in any order.
+
+    Each word is quoted, so user input can never be parsed as FTS5 syntax (AND, NEAR, column filters).
+    Returns None if the text has no searchable words.
+    """
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{word}"' for word in words) or None
+
+
+class LeadStore:
+    """Long-lived SQLite store for the agent's leads.
+
+    A single connection is opened per store and shared by every agent method. The database runs in
+    WAL mode so the dashboard can read KPIs while the agent is writing.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=256)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        with self._lock, self._conn:
+            has_ledger = self._conn.execute(SQL_TABLE_EXISTS, ('daily_sends',)).fetchone() is not None
+            self._conn.executescript(SCHEMA)
+            if not has_ledger:
+                today = date.today().isoformat()
+                self._conn.execute(SQL_SEED_SENDS, (today, today))
+            self._migrate()
+        logger.info(f"Database '{self.db_path}' setup complete.")
+
+    def _migrate(self):
+        """Runs data migrations newer than the database's user_version. Called inside a transaction."""
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            # Move legacy conversation_history blobs into the messages table
+            rows = self._conn.execute(SQL_LEGACY_HISTORIES).fetchall()
+            for user_id, conversation_history in rows:
+                self._conn.executemany(
+                    SQL_APPEND_MESSAGE,
+                    [(user_id, None, role, text) for role, text in parse_history_blob(conversation_history)],
+                )
+            if rows:
+                logger.info(f"Migrated conversation history of {len(rows)} leads to the messages table.")
+        if version < 2:
+            # Index the messages stored before the full-text index existed
+            self._conn.execute(SQL_REBUILD_FTS)
+        if version < SCHEMA_VERSION:
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        """Closes the underlying connection."""
+        with self._lock:
+            self._conn.close()
+
+    def filter_uncontacted(self, user_ids):
+        """Returns the subset of user_ids that are not yet in the leads table.
+
+        Ids are checked in chunked IN queries against the primary key, so a whole follower batch
+        costs a handful of statements instead of one round trip per follower.
+        """
+        pending = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+        known = set()
+        with self._lock:
+            for start in range(0, len(pending), IN_CHUNK_SIZE):
+                chunk = pending[start:start + IN_CHUNK_SIZE]
+                sql = SQL_KNOWN_LEADS.format(placeholders=", ".join("?" * len(chunk)))
+                known.update(row[0] for row in self._conn.execute(sql, chunk))
+        return [user_id for user_id in pending if user_id not in known]
+
+    def record_initial_send(self, user_id, username, full_name, text=None, ig_message_id=None):
+        """Inserts a newly contacted lead and counts the send against today's quota.
+
+        All writes happen in the same transaction, so the ledger never drifts from the leads table.
+        When given, the outreach text is stored as the first message of the conversation.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(SQL_INSERT_LEAD, (str(user_id), username, full_name, 'contacted'))
+            self._conn.execute(SQL_INCREMENT_SENDS, (date.today().isoformat(),))
+            if text:
+                self._conn.execute(SQL_APPEND_MESSAGE, (str(user_id), ig_message_id, 'agent', text))
+
+    def leads_with_status(self, status):
+        """Returns (user_id, username) rows for every lead with the given status."""
+        with self._lock:
+            return self._conn.execute(SQL_LEADS_BY_STATUS, (status,)).fetchall()
+
+    def count_with_status(self, status):
+        """Returns the number of leads with the given status."""
+        with self._lock:
+            return self._conn.execute(SQL_COUNT_BY_STATUS, (status,)).fetchone()[0]
+
+    def mark_replied(self, user_id):
+        """Moves a lead to 'replied'."""
+        with self._lock, self._conn:
+            self._conn.execute(SQL_MARK_REPLIED, (str(user_id),))
+
+    def append_messages(self, user_id, messages):
+        """Appends (role, text, ig_message_id) turns to a lead's conversation, oldest first.
+
+        Messages already stored under the same Instagram message id are ignored, so re-ingesting a
+        thread is harmless. Returns the number of new rows.
+        """
+        rows = [(str(user_id), ig_message_id and str(ig_message_id), role, text) for role, text, ig_message_id in messages]
+        with self._lock, self._conn:
+            # rowcount, unlike total_changes, leaves out the rows the FTS triggers write
+            return self._conn.executemany(SQL_APPEND_MESSAGE, rows).rowcount
+
+    def recent_messages(self, user_id, limit=50):
+        """Returns the last `limit` (role, text) turns of a lead's conversation, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(SQL_RECENT_MESSAGES, (str(user_id), limit)).fetchall()
+        rows.reverse()
+        return rows
+
+    def sends_today(self):
+        """Returns the number of outreach messages sent today, read from the quota ledger."""
+        with self._lock:
+            row = self._conn.execute(SQL_SENDS_ON_DAY, (date.today().isoformat(),)).fetchone()
+        return row[0] if row else 0
+
+    def get_frontier(self, target_username):
+        """Returns (target_user_id, next_max_id) for a target account, or None if never harvested."""
+        with self._lock:
+            return self._conn.execute(SQL_GET_FRONTIER, (target_username,)).fetchone()
+
+    def save_frontier(self, target_username, target_user_id, next_max_id):
+        """Persists the follower pagination cursor for a target account."""
+        with self._lock, self._conn:
+            self._conn.execute(SQL_SAVE_FRONTIER, (target_username, str(target_user_id), next_max_id or ''))
+
+    def thread_watermarks(self, thread_ids):
+        """Returns {thread_id: (last_activity_at, last_seen_message_id)} for the threads already synced."""
+        thread_ids = [str(thread_id) for thread_id in thread_ids]
+        watermarks = {}
+        with self._lock:
+            for start in range(0, len(thread_ids), IN_CHUNK_SIZE):
+                chunk = thread_ids[start:start + IN_CHUNK_SIZE]
+                sql = SQL_THREAD_WATERMARKS.format(placeholders=", ".join("?" * len(chunk)))
+                for thread_id, last_activity_at, last_seen_message_id in self._conn.execute(sql, chunk):
+                    watermarks[thread_id] = (last_activity_at, last_seen_message_id)
+        return watermarks
+
+    def save_thread_watermark(self, thread_id, last_activity_at, last_seen_message_id):
+        """Records how far a DM thread has been synced."""
+        with self._lock, self._conn:
+            self._conn.execute(SQL_SAVE_THREAD_WATERMARK, (str(thread_id), last_activity_at, last_seen_message_id))
+
+    def search_conversations(self, query, limit=20, offset=0, status=None):
+        """Full-text search over lead conversations, best match first.
+
+        Returns (hits, has_more). Each hit is one lead, with its best-ranked matching message as a
+        snippet (matches wrapped in [ ]). Pass offset + limit as the next offset while has_more is True.
+        """
+        match = fts_query(query)
+        if match is None:
+            return [], False
+        limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+        with self._lock:
+            rows = self._conn.execute(SQL_SEARCH_LEADS, (match, status, status, limit + 1, max(0, offset))).fetchall()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            snippets = {}
+            if rows:
+                sql = SQL_SEARCH_SNIPPETS.format(placeholders=", ".join("?" * len(rows)))
+                snippets = dict(self._conn.execute(sql, (match, *(row[0] for row in rows))))
+        hits = [
+            {
+                "user_id": lead_id,
+                "username": username,
+                "full_name": full_name,
+                "status": lead_status,
+                "snippet": snippets.get(message_id),
+                "role": role,
+                "created_at": created_at,
+                "rank": rank,
+            }
+            for message_id, lead_id, username, full_name, lead_status, role, created_at, rank in rows
+        ]
+        return hits, has_more
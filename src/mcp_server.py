@@ -1,12 +1,38 @@
 from mcp.server.fastmcp import FastMCP
-from instagrapi import Client
-from instagrapi.exceptions import TwoFactorRequired
 import argparse
 from typing import Optional, List, Dict, Any
 import os
 from dotenv import load_dotenv
 import logging
+import asyncio
+import base64
+import contextvars
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from datetime import datetime
+from pydantic import BaseModel
+
+try:
+    from src.user_cache import UserIdCache
+    from src.message_index import MessageIndex
+    from src.media_cache import MediaCache
+    from src.inbox_mirror import InboxMirror, InboxSyncer
+    from src.client_pool import ClientPool, session_file
+    from src.singleflight import SingleFlight
+    from src.throttle import Throttle, ThrottledClient
+except ImportError:  # Running as a script from inside src/
+    from user_cache import UserIdCache
+    from message_index import MessageIndex
+    from media_cache import MediaCache
+    from inbox_mirror import InboxMirror, InboxSyncer
+    from client_pool import ClientPool, session_file
+    from singleflight import SingleFlight
+    from throttle import Throttle, ThrottledClient
 
 # Load environment variables from .env file
 load_dotenv()
@@ -19,7 +45,169 @@ INSTRUCTIONS = """
 This server is used to send messages to a user on Instagram.
 """
 
-client = Client()
+# A saved session is reused without logging in for up to this many days after its last login
+SESSION_MAX_AGE_DAYS = int(os.getenv("INSTAGRAM_SESSION_MAX_AGE_DAYS", "30"))
+
+# 2FA codes for accounts whose first login happens on a tool call
+_verification_codes: Dict[str, str] = {}
+
+# Instagram calls per account: most in flight at once and the shortest gap between two of them
+# (seconds). Both adapt down while Instagram rate limits the account, which also pauses its calls.
+CLIENT_MAX_CONCURRENCY = int(os.getenv("INSTAGRAM_CLIENT_MAX_CONCURRENCY", "4"))
+CLIENT_MIN_INTERVAL = float(os.getenv("INSTAGRAM_CLIENT_MIN_INTERVAL", "0.5"))
+
+# One throttle per account, kept when an idle client is evicted so a penalty outlives its client
+_throttles: Dict[str, Throttle] = {}
+_throttles_lock = threading.Lock()
+
+
+def _throttle_for(account: str) -> Throttle:
+    with _throttles_lock:
+        throttle = _throttles.get(account)
+        if throttle is None:
+            throttle = _throttles[account] = Throttle(
+                account, max_concurrency=CLIENT_MAX_CONCURRENCY, min_interval=CLIENT_MIN_INTERVAL
+            )
+        return throttle
+
+
+def _session_usable(cl: Any) -> bool:
+    """True if a client's loaded settings hold a session id from a recent enough login."""
+    if not (getattr(cl, "authorization_data", None) or {}).get("sessionid"):
+        return False
+    last_login = getattr(cl, "last_login", None) or 0
+    return time.time() - last_login < SESSION_MAX_AGE_DAYS * 24 * 3600
+
+
+def _login_account(account: str, password: Optional[str], path: Path) -> Any:
+    """Create the instagrapi client of an account, reusing its saved session when it is still usable.
+
+    A usable session is trusted without a login request, so startup and the first tool call skip the
+    auth round trip (and the challenge risk that comes with it). If Instagram rejects the session
+    later, the client logs in again with the password and retries the request. Every request goes
+    through the account's throttle.
+    """
+    # instagrapi is slow to import; load it on the first tool call rather than at startup
+    from instagrapi import Client
+    from instagrapi.exceptions import LoginRequired, TwoFactorRequired
+
+    cl = Client()
+    if path.exists():
+        cl.load_settings(path)
+    cl.username, cl.password = account, password
+
+    def relogin_on_expiry(cl: Any, e: Exception) -> None:
+        if isinstance(e, LoginRequired) and password:
+            logger.info(f"Session of {account} expired, logging in again")
+            cl.relogin()
+            cl.dump_settings(path)
+            return
+        raise e
+
+    if _session_usable(cl):
+        logger.info(f"Reusing saved session of {account} from {path}")
+        cl.handle_exception = relogin_on_expiry
+        return ThrottledClient(cl, _throttle_for(account))
+    if not password:
+        raise ValueError(f"The saved session of '{account}' is missing or too old and no password is configured.")
+
+    try:
+        cl.login(account, password)
+    except TwoFactorRequired:
+        verification_code = _verification_codes.get(account)
+        if not verification_code:
+            raise ValueError(f"Two-factor authentication required for '{account}' but no verification code was provided.")
+        cl.login(account, password, verification_code=verification_code)
+    # Save session for future use to avoid repeated fresh authentication
+    cl.dump_settings(path)
+    cl.handle_exception = relogin_on_expiry
+    logger.info(f"Logged in to Instagram as {account}, session saved to {path}")
+    return ThrottledClient(cl, _throttle_for(account))
+
+
+def _parse_accounts(spec: str) -> Dict[str, str]:
+    """Parse INSTAGRAM_ACCOUNTS ("user1:password1,user2:password2") into {username: password}."""
+    accounts = {}
+    for item in spec.split(","):
+        username, _, password = item.strip().partition(":")
+        if username and password:
+            accounts[username.lstrip("@")] = password
+    return accounts
+
+
+# One client per Instagram account, created on the account's first tool call from
+# <account>_session.json and the account's password (INSTAGRAM_ACCOUNTS for accounts other than the
+# one the server is started with).
+client_pool = ClientPool(
+    _login_account,
+    passwords=_parse_accounts(os.getenv("INSTAGRAM_ACCOUNTS", "")),
+    session_dir=os.getenv("INSTAGRAM_SESSION_DIR", "."),
+    idle_seconds=int(os.getenv("INSTAGRAM_CLIENT_IDLE_SECONDS", "1800")),
+)
+
+# Account the current tool call acts as; None means the default account
+_current_account: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("instagram_account", default=None)
+
+
+class _AccountClient:
+    """Stands in for an instagrapi Client, forwarding to the client of the account the current tool call acts as."""
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(client_pool.get(_current_account.get()), name)
+
+
+client = _AccountClient()
+
+
+# Worker threads the blocking instagrapi work of every tool runs on, and how many calls of one tool
+# may run at once (tools not listed get DEFAULT_TOOL_CONCURRENCY). Tools that page through large
+# lists, download files or fan out into their own thread pools get lower limits, so a burst of
+# them cannot take every worker.
+TOOL_WORKERS = int(os.getenv("INSTAGRAM_TOOL_WORKERS", "16"))
+DEFAULT_TOOL_CONCURRENCY = 4
+TOOL_CONCURRENCY = {
+    "send_messages": 1,
+    "send_photo_message": 2,
+    "send_video_message": 2,
+    "check_user_online_status": 2,
+    "get_user_followers": 2,
+    "get_user_following": 2,
+    "get_user_posts": 2,
+    "download_media_from_message": 2,
+    "download_thread_media": 1,
+    "download_shared_post_from_message": 2,
+}
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="mcp-tool")
+
+
+def _blocking_tool(func):
+    """Turn a blocking tool into an async one that runs on tool_executor.
+
+    The call acts as the account given in its `account` argument and waits for a slot of its tool's
+    concurrency limit first, so independent tool calls overlap instead of queueing behind each other.
+    """
+    semaphore = asyncio.Semaphore(TOOL_CONCURRENCY.get(func.__name__, DEFAULT_TOOL_CONCURRENCY))
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = _current_account.set(kwargs.get("account"))
+        try:
+            call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+        finally:
+            _current_account.reset(token)
+        async with semaphore:
+            return await asyncio.get_running_loop().run_in_executor(tool_executor, call)
+    return wrapper
+
+
+def _in_context(func):
+    """Wrap func so worker threads run it as the account of the tool call that created the wrapper."""
+    context = contextvars.copy_context()
+    return lambda *args: context.copy().run(func, *args)
+
+
+# username -> user_id resolutions shared by every tool (memory LRU backed by SQLite)
+user_cache = UserIdCache(os.getenv("INSTAGRAM_CACHE_DB", "instagram_cache.db"))
 
 mcp = FastMCP(
    name="Instagram DMs",
@@ -27,23 +215,204 @@ mcp = FastMCP(
 )
 
 
+def _fetch_message_page(thread_id: str, cursor: Optional[str] = None):
+    """Fetch one page of a thread's messages (newest first) and the cursor of the next older page.
+
+    Same request instagrapi's direct_thread pages through, exposed one page at a time so the
+    message index can resume from a stored cursor.
+    """
+    from instagrapi.extractors import extract_direct_message
+
+    params = {"visual_message_return_type": "unseen", "direction": "older", "seq_id": "40065", "limit": "20"}
+    if cursor:
+        params["cursor"] = cursor
+    result = client.private_request(f"direct_v2/threads/{thread_id}/", params=params)
+    thread = result["thread"]
+    messages = []
+    for item in thread.get("items", []):
+        item["thread_id"] = thread.get("thread_id", thread_id)
+        messages.append(extract_direct_message(item))
+    next_cursor = thread.get("oldest_cursor") if thread.get("has_older", True) else None
+    return messages, next_cursor
+
+
+# Messages fetched by any tool, indexed by thread and message id for the download tools. One index per
+# account, so a tool acting as one account is never served messages another account fetched.
+_message_indexes: Dict[str, MessageIndex] = {}
+_message_indexes_lock = threading.Lock()
+
+
+def _message_index() -> MessageIndex:
+    """Message index of the account the current tool call acts as."""
+    account = _acting_account()
+    with _message_indexes_lock:
+        index = _message_indexes.get(account)
+        if index is None:
+            index = _message_indexes[account] = MessageIndex(_fetch_message_page)
+        return index
+
+# Downloaded media, shared across tools and threads and keyed by media pk
+media_cache = MediaCache(
+    os.getenv("INSTAGRAM_MEDIA_CACHE_DIR", ".media_cache"),
+    max_bytes=int(os.getenv("INSTAGRAM_MEDIA_CACHE_MB", "1024")) * 1024 * 1024,
+)
+DOWNLOAD_WORKERS = 4
+MAX_DOWNLOAD_WORKERS = 8
+
+# Optional local mirror of the inbox, enabled with --mirror-db / INSTAGRAM_MIRROR_DB. Read tools are
+# served from it while it is fresher than their max_age_seconds; write tools update it as they go.
+MIRROR_MAX_AGE = int(os.getenv("INSTAGRAM_MIRROR_MAX_AGE", "60"))
+MIRROR_SYNC_SECONDS = int(os.getenv("INSTAGRAM_MIRROR_SYNC_SECONDS", "20"))
+MIRROR_MAX_THREADS = 200
+MIRROR_THREAD_MESSAGES = 20
+mirror: Optional[InboxMirror] = None
+
+
+def _mirror_inbox_page(cursor: Optional[str]):
+    threads, next_cursor = client.direct_threads_chunk(thread_message_limit=MIRROR_THREAD_MESSAGES, cursor=cursor)
+    return [t.model_dump(mode="json") for t in threads], next_cursor
+
+
+def _mirror_message_page(thread_id: str, cursor: Optional[str]):
+    messages, next_cursor = _fetch_message_page(thread_id, cursor)
+    _message_index().record(thread_id, messages)
+    return [m.model_dump(mode="json") for m in messages], next_cursor
+
+
+def start_inbox_mirror(db_path: str) -> None:
+    """Open the inbox mirror and start the background thread that keeps it in sync."""
+    global mirror
+    mirror = InboxMirror(db_path)
+    InboxSyncer(
+        mirror, _mirror_inbox_page, _mirror_message_page,
+        interval=MIRROR_SYNC_SECONDS, max_threads=MIRROR_MAX_THREADS,
+    ).start()
+    logger.info(f"Inbox mirror enabled at {db_path}")
+
+
+def _active_mirror() -> Optional[InboxMirror]:
+    """The inbox mirror, if it is enabled and mirrors the account the current tool call acts as."""
+    account = _current_account.get()
+    if mirror is None or (account and account.lstrip("@") != client_pool.default_account):
+        return None
+    return mirror
+
+
+def _mirror_fresh(max_age: int) -> bool:
+    """True if the mirror applies to this call and its last pass over the inbox is at most max_age seconds old."""
+    active = _active_mirror()
+    if active is None:
+        return False
+    age = active.inbox_age()
+    return age is not None and age <= max_age
+
+
+def _mirror_sent(dm: Any) -> None:
+    """Add a message the server just sent to the mirror, so reads see it before the next sync."""
+    active = _active_mirror()
+    if active is None or not dm:
+        return
+    try:
+        active.record_sent(dm.model_dump(mode="json"))
+    except Exception as e:
+        logger.warning(f"Could not add sent message to the inbox mirror: {e}")
+
+
+# Identical user lookups made at the same time (or within a few seconds) share one request
+single_flight = SingleFlight(ttl=float(os.getenv("INSTAGRAM_SINGLE_FLIGHT_TTL", "10")))
+
+
+def _acting_account() -> str:
+    """Name of the account the current tool call acts as."""
+    return (_current_account.get() or client_pool.default_account or "").lstrip("@")
+
+
+def _coalesced(kind: str, key: str, fetch):
+    """Run fetch() through single_flight, keyed by lookup kind, acting account and key."""
+    return single_flight.do((kind, _acting_account(), key), fetch)
+
+
+def _resolve_user_id(username: str) -> Optional[str]:
+    """Resolve a username to a user ID through the shared cache. Returns None if the user does not exist."""
+    def fetch(name: str) -> Optional[str]:
+        from instagrapi.exceptions import UserNotFound
+        try:
+            return client.user_id_from_username(name)
+        except UserNotFound:
+            return None
+
+    return user_cache.resolve(username, lambda name: _coalesced("user_id", name, lambda: fetch(name)))
+
+
+# Concurrency used to resolve many usernames at once, and limits for the batch send tool
+RESOLVE_WORKERS = 8
+MAX_BATCH_SIZE = 500
+MAX_SEND_CONCURRENCY = 8
+
+# Presence lookups: user IDs per direct_users_presence call, how long a result may be reused (seconds),
+# and how many (account, user ID) results are kept, oldest fetched dropped first
+PRESENCE_BATCH_SIZE = 50
+PRESENCE_CACHE_TTL = 30
+PRESENCE_CACHE_MAX_ENTRIES = 5000
+_presence_cache: "OrderedDict[tuple, Any]" = OrderedDict()
+_presence_lock = threading.Lock()
+
+
+def _resolve_many(usernames: List[str], max_workers: int = RESOLVE_WORKERS) -> Dict[str, Any]:
+    """Resolve several usernames concurrently through the shared cache.
+
+    Returns a dict mapping each distinct username to its user ID, None if it does not exist, or the
+    exception raised while resolving it.
+    """
+    distinct = list(dict.fromkeys(usernames))
+
+    def resolve(username):
+        try:
+            return _resolve_user_id(username)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(distinct)))) as pool:
+        return dict(zip(distinct, pool.map(_in_context(resolve), distinct)))
+
+
+class _RateLimiter:
+    """Spaces out operations started from any thread so no more than `rate_per_minute` begin per minute."""
+
+    def __init__(self, rate_per_minute: float):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
 @mcp.tool()
-def send_message(username: str, message: str) -> Dict[str, Any]:
+@_blocking_tool
+def send_message(username: str, message: str, account: Optional[str] = None) -> Dict[str, Any]:
     """Send an Instagram direct message to a user by username.
 
     Args:
         username: Instagram username of the recipient.
         message: The message text to send.
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary with success status and a status message.
     """
     if not username or not message:
         return {"success": False, "message": "Username and message must be provided."}
     try:
-        user_id = client.user_id_from_username(username)
+        user_id = _resolve_user_id(username)
         if not user_id:
             return {"success": False, "message": f"User '{username}' not found."}
         dm = client.direct_send(message, [user_id])
+        _mirror_sent(dm)
         if dm:
             return {"success": True, "message": "Message sent to user.", "direct_message_id": getattr(dm, 'id', None)}
         else:
@@ -53,13 +422,78 @@ def send_message(username: str, message: str) -> Dict[str, Any]:
 
 
 @mcp.tool()
-def send_photo_message(username: str, photo_path: str) -> Dict[str, Any]:
+@_blocking_tool
+def send_messages(messages: List[Dict[str, str]], rate_per_minute: float = 20.0, max_concurrency: int = 2, account: Optional[str] = None) -> Dict[str, Any]:
+    """Send Instagram direct messages to many users in one call.
+
+    All usernames are resolved up front (concurrently, through the shared cache), then messages are
+    sent at the given rate. A failed recipient does not stop the rest of the batch.
+
+    Args:
+        messages: List of {"username": ..., "message": ...} items (at most 500).
+        rate_per_minute: Maximum number of sends started per minute (default 20).
+        max_concurrency: Maximum number of sends in flight at once (default 2, max 8).
+        account: Instagram account to act as (default: the account the server was started with).
+    Returns:
+        A dictionary with success status, sent/failed counts and one result per item, in input order.
+    """
+    if not messages or not isinstance(messages, list):
+        return {"success": False, "message": "A non-empty list of messages must be provided."}
+    if len(messages) > MAX_BATCH_SIZE:
+        return {"success": False, "message": f"At most {MAX_BATCH_SIZE} messages can be sent per call."}
+
+    results: List[Dict[str, Any]] = [
+        {"username": item.get("username") if isinstance(item, dict) else None, "success": False}
+        for item in messages
+    ]
+    valid = [
+        i for i, item in enumerate(messages)
+        if isinstance(item, dict) and item.get("username") and item.get("message")
+    ]
+    for i in set(range(len(messages))) - set(valid):
+        results[i]["message"] = "Username and message must be provided."
+
+    resolved = _resolve_many([messages[i]["username"] for i in valid])
+    limiter = _RateLimiter(rate_per_minute)
+
+    def send(i):
+        username = messages[i]["username"]
+        user_id = resolved.get(username)
+        if isinstance(user_id, Exception):
+            results[i]["message"] = str(user_id)
+            return
+        if not user_id:
+            results[i]["message"] = f"User '{username}' not found."
+            return
+        limiter.wait()
+        try:
+            dm = client.direct_send(messages[i]["message"], [user_id])
+            _mirror_sent(dm)
+            if dm:
+                results[i].update(success=True, message="Message sent to user.", direct_message_id=getattr(dm, 'id', None))
+            else:
+                results[i]["message"] = "Failed to send message."
+        except Exception as e:
+            results[i]["message"] = str(e)
+
+    workers = max(1, min(max_concurrency, MAX_SEND_CONCURRENCY, len(valid) or 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(_in_context(send), valid))
+
+    sent = sum(1 for r in results if r["success"])
+    return {"success": sent > 0, "sent": sent, "failed": len(results) - sent, "results": results}
+
+
+@mcp.tool()
+@_blocking_tool
+def send_photo_message(username: str, photo_path: str, account: Optional[str] = None) -> Dict[str, Any]:
     """Send a photo via Instagram direct message to a user by username.
 
     Args:
         username: Instagram username of the recipient.
         photo_path: Path to the photo file to send.
         message: Optional message text to accompany the photo.
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary with success status and a status message.
     """
@@ -70,11 +504,12 @@ def send_photo_message(username: str, photo_path: str) -> Dict[str, Any]:
         return {"success": False, "message": f"Photo file not found: {photo_path}"}
     
     try:
-        user_id = client.user_id_from_username(username)
+        user_id = _resolve_user_id(username)
         if not user_id:
             return {"success": False, "message": f"User '{username}' not found."}
         
         result = client.direct_send_photo(Path(photo_path), [user_id])
+        _mirror_sent(result)
         if result:
             return {"success": True, "message": "Photo sent successfully.", "direct_message_id": getattr(result, 'id', None)}
         else:
@@ -84,12 +519,14 @@ def send_photo_message(username: str, photo_path: str) -> Dict[str, Any]:
 
 
 @mcp.tool()
-def send_video_message(username: str, video_path: str) -> Dict[str, Any]:
+@_blocking_tool
+def send_video_message(username: str, video_path: str, account: Optional[str] = None) -> Dict[str, Any]:
     """Send a video via Instagram direct message to a user by username.
 
     Args:
         username: Instagram username of the recipient.
         video_path: Path to the video file to send.
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary with success status and a status message.
     """
@@ -100,11 +537,12 @@ def send_video_message(username: str, video_path: str) -> Dict[str, Any]:
         return {"success": False, "message": f"Video file not found: {video_path}"}
     
     try:
-        user_id = client.user_id_from_username(username)
+        user_id = _resolve_user_id(username)
         if not user_id:
             return {"success": False, "message": f"User '{username}' not found."}
 
         result = client.direct_send_video(Path(video_path), [user_id])
+        _mirror_sent(result)
         if result:
             return {"success": True, "message": "Video sent successfully.", "direct_message_id": getattr(result, 'id', None)}
         else:
@@ -113,112 +551,296 @@ def send_video_message(username: str, video_path: str) -> Dict[str, Any]:
         return {"success": False, "message": str(e)}
 
 
+# Character budget of a compact response; items beyond it are dropped and counted in "omitted"
+COMPACT_MAX_CHARS = 50_000
+
+
+def _field_tree(fields: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+    """Turn ["id", "users.username"] into {"id": {}, "users": {"username": {}}}."""
+    if not fields:
+        return None
+    tree: Dict[str, Any] = {}
+    for field in fields:
+        node = tree
+        for part in field.split("."):
+            node = node.setdefault(part, {})
+    return tree
+
+
+def _jsonable(value: Any) -> Any:
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _project(obj: Any, tree: Optional[Dict[str, Any]] = None, compact: bool = False) -> Any:
+    """Serialize only the requested fields of a model, dict or list.
+
+    Fields are read straight off the object, so nested structures that were not asked for are never
+    dumped. Without a field tree the whole object is dumped. In compact mode None values are dropped.
+    """
+    if isinstance(obj, (list, tuple)):
+        return [_project(item, tree, compact) for item in obj]
+    if not tree:
+        if isinstance(obj, BaseModel):
+            return obj.model_dump(mode="json", exclude_none=compact)
+        if isinstance(obj, dict):
+            return {k: _project(v, None, compact) for k, v in obj.items() if not (compact and v is None)}
+        return _jsonable(obj)
+    result = {}
+    for name, subtree in tree.items():
+        value = obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+        if compact and value is None:
+            continue
+        result[name] = _project(value, subtree, compact)
+    return result
+
+
+def _cap_items(items: List[Any], max_chars: int = COMPACT_MAX_CHARS) -> Dict[str, Any]:
+    """Keep as many leading items as fit in max_chars of JSON and report how many were cut."""
+    kept = []
+    used = 0
+    for item in items:
+        used += len(json.dumps(item, separators=(",", ":"), default=str))
+        if used > max_chars and kept:
+            break
+        kept.append(item)
+    omitted = len(items) - len(kept)
+    return {"items": kept, "truncated": omitted > 0, "omitted": omitted}
+
+
+def _serialize_list(key: str, objs: List[Any], fields: Optional[List[str]], compact: bool) -> Dict[str, Any]:
+    """Build a tool response holding a projected list, size-capped in compact mode."""
+    items = [_project(obj, _field_tree(fields), compact) for obj in objs]
+    if not compact:
+        return {"success": True, key: items}
+    capped = _cap_items(items)
+    return {"success": True, key: capped["items"], "truncated": capped["truncated"], "omitted": capped["omitted"]}
+
+
+def _encode_cursor(state: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode()
+
+
+def _decode_cursor(token: str) -> Dict[str, Any]:
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor.")
+
+
+def _fetch_thread_page(amount: int, selected_filter: str, thread_message_limit: Optional[int], cursor: Optional[str]):
+    """Fetch `amount` inbox threads starting at a continuation token.
+
+    The token records the Instagram inbox cursor of the page to resume from and how many threads of
+    that page were already returned, so each call only requests pages it has not served yet.
+    Returns (threads, next_token), next_token being None when the inbox is exhausted.
+    """
+    state = _decode_cursor(cursor) if cursor else {"c": None, "s": 0, "f": selected_filter}
+    if state.get("f", "") != selected_filter:
+        raise ValueError("Cursor was issued for a different selected_filter.")
+    page_cursor, skip = state.get("c"), state.get("s", 0)
+
+    threads = []
+    while len(threads) < amount:
+        chunk, next_page_cursor = client.direct_threads_chunk(
+            selected_filter, thread_message_limit=thread_message_limit, cursor=page_cursor
+        )
+        remaining = chunk[skip:]
+        take = amount - len(threads)
+        threads.extend(remaining[:take])
+        if len(remaining) > take:
+            # Page only partly served: resume inside it next time
+            return threads, _encode_cursor({"c": page_cursor, "s": skip + take, "f": selected_filter})
+        if not chunk or not next_page_cursor:
+            return threads, None
+        page_cursor, skip = next_page_cursor, 0
+    return threads, _encode_cursor({"c": page_cursor, "s": 0, "f": selected_filter})
+
+
+def _mirror_thread_page(amount: int, thread_message_limit: Optional[int], cursor: Optional[str], max_age: int):
+    """Serve a list_chats page from the inbox mirror, or return None to go to Instagram.
+
+    Mirror tokens hold an offset into the mirrored inbox. Freshness is checked on the first page only,
+    so a client paging through keeps reading the same snapshot. Past the last mirrored thread the page
+    is completed live, from the inbox cursor the syncer stopped at.
+    """
+    active = _active_mirror()
+    if active is None:
+        return None
+    state = _decode_cursor(cursor) if cursor else None
+    if state is None:
+        if not _mirror_fresh(max_age):
+            return None
+        state = {"o": 0, "f": ""}
+    elif "o" not in state:
+        return None
+    offset = state["o"]
+    threads = active.threads(offset, amount, MIRROR_THREAD_MESSAGES if thread_message_limit is None else thread_message_limit)
+    if len(threads) == amount:
+        return threads, _encode_cursor({"o": offset + amount, "f": ""})
+    complete, tail = active.inbox_tail()
+    if complete or not tail:
+        return threads, None
+    rest, next_cursor = _fetch_thread_page(
+        amount - len(threads), "", thread_message_limit, _encode_cursor({"c": tail, "s": 0, "f": ""})
+    )
+    return threads + rest, next_cursor
+
+
 @mcp.tool()
+@_blocking_tool
 def list_chats(
     amount: int = 20,
     selected_filter: str = "",
     thread_message_limit: Optional[int] = None,
     full: bool = False,
     fields: Optional[List[str]] = None,
+    cursor: Optional[str] = None,
+    compact: bool = False,
+    max_age_seconds: int = MIRROR_MAX_AGE,
+    account: Optional[str] = None,
 ) -> Dict[str, Any]:
     """Get Instagram Direct Message threads (chats) from the user's account, with optional filters and limits.
 
+    Results are paginated: pass the returned next_cursor back as `cursor` to get the following page
+    without refetching earlier threads. When the inbox mirror is enabled, unfiltered listings are
+    served from it if it is at most max_age_seconds old.
+
     Args:
         amount: Number of threads to fetch (default 20).
         selected_filter: Filter for threads ("", "flagged", or "unread").
         thread_message_limit: Limit for messages per thread.
         full: If True, return the full thread object for each chat (default False).
-        fields: If provided, return only these fields for each thread.
+        fields: If provided, return only these fields for each thread (dotted paths such as "users.username" select nested fields).
+        cursor: Continuation token from a previous call's next_cursor.
+        compact: If True, drop empty values and cap the response size, marking it as truncated.
+        max_age_seconds: Maximum age of mirrored data to accept (0 always reads from Instagram).
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
-        A dictionary with success status and the list of threads or error message.
+        A dictionary with success status, the list of threads, next_cursor (None on the last page) and
+        source ("mirror" or "instagram"), or error message.
     """
     def thread_summary(thread):
-        t = thread if isinstance(thread, dict) else thread.dict()
-        users = t.get("users", [])
-        user_summaries = [
-            {
-                "username": u.get("username"),
-                "full_name": u.get("full_name"),
-                "pk": u.get("pk")
-            }
-            for u in users
-        ]
+        messages = _field(thread, "messages")
         return {
-            "thread_id": t.get("id"),
-            "thread_title": t.get("thread_title"),
-            "users": user_summaries,
-            "last_activity_at": t.get("last_activity_at"),
-            "last_message": t.get("messages", [{}])[-1] if t.get("messages") else None
+            "thread_id": _field(thread, "id"),
+            "thread_title": _field(thread, "thread_title"),
+            "users": _project(_field(thread, "users"), {"username": {}, "full_name": {}, "pk": {}}),
+            "last_activity_at": _jsonable(_field(thread, "last_activity_at")),
+            "last_message": _project(messages[-1], None, compact) if messages else None
         }
 
-    def filter_fields(thread, fields):
-        t = thread if isinstance(thread, dict) else thread.dict()
-        return {field: t.get(field) for field in fields}
+    if amount < 1:
+        return {"success": False, "message": "amount must be at least 1."}
 
     try:
-        threads = client.direct_threads(amount, selected_filter, thread_message_limit)
-        if full:
-            return {"success": True, "threads": [t.dict() if hasattr(t, 'dict') else str(t) for t in threads]}
-        elif fields:
-            return {"success": True, "threads": [filter_fields(t, fields) for t in threads]}
+        page = None if selected_filter else _mirror_thread_page(amount, thread_message_limit, cursor, max_age_seconds)
+        if page is not None:
+            (threads, next_cursor), source = page, "mirror"
+        else:
+            (threads, next_cursor), source = _fetch_thread_page(amount, selected_filter, thread_message_limit, cursor), "instagram"
+        if full or fields:
+            response = _serialize_list("threads", threads, None if full else fields, compact)
         else:
-            return {"success": True, "threads": [thread_summary(t) for t in threads]}
+            response = _serialize_list("threads", [thread_summary(t) for t in threads], None, compact)
+        response["next_cursor"] = next_cursor
+        response["source"] = source
+        return response
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 
+# Message item types that carry a shared post/reel, and the message attributes holding it
+SHARED_POST_ATTRS = {
+    "clip": ("clip",),
+    "media_share": ("media_share",),
+    "post_share": ("media_share", "post_share"),
+    "reel_share": ("reel_share",),
+    "xma_media_share": ("xma_share", "xma_media_share"),
+}
+
+
+def _field(obj: Any, name: str) -> Any:
+    """Read a field from either a model or a dict."""
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def _shared_post(message: Any):
+    """Return (code, url, payload) of the post/reel shared in a message, or (None, None, None).
+
+    Only the attributes that can hold a shared post for the message's item_type are inspected.
+    """
+    for attr in SHARED_POST_ATTRS.get(_field(message, "item_type"), ()):
+        obj = _field(message, attr)
+        if obj:
+            code = _field(obj, "code") or _field(obj, "pk")
+            url = _field(obj, "url") or (f"https://www.instagram.com/reel/{code}/" if code else None)
+            return code, (str(url) if url else None), obj
+    return None, None, None
+
+
+def _message_summary(message: Any, include_raw: bool = True) -> Dict[str, Any]:
+    """Build the scalar fields list_messages returns, without dumping the whole message model."""
+    user_id = _field(message, "user_id")
+    shared_code, shared_url, shared_obj = _shared_post(message)
+    summary = {
+        "id": str(_field(message, "id")),
+        "user_id": str(user_id) if user_id is not None else None,
+        "thread_id": _jsonable(_field(message, "thread_id")),
+        "timestamp": _jsonable(_field(message, "timestamp")),
+        "item_type": _field(message, "item_type"),
+        "text": _field(message, "text"),
+        "is_sent_by_viewer": _field(message, "is_sent_by_viewer"),
+        "shared_post_url": shared_url,
+        "shared_post_code": _jsonable(shared_code),
+    }
+    if include_raw:
+        summary["shared_post_info"] = _project(shared_obj) if shared_obj else None
+    return summary
+
+
 @mcp.tool()
-def list_messages(thread_id: str, amount: int = 20) -> Dict[str, Any]:
+@_blocking_tool
+def list_messages(thread_id: str, amount: int = 20, include_raw: bool = True, max_age_seconds: int = MIRROR_MAX_AGE, account: Optional[str] = None) -> Dict[str, Any]:
     """Get messages from a specific Instagram Direct Message thread by thread ID, with an optional limit.
 
+    Each message carries its id, sender, timestamp, item_type and text, plus the URL/code of any
+    shared post/reel (use them to pick the right download tool).
+
     Args:
         thread_id: The thread ID to fetch messages from.
         amount: Number of messages to fetch (default 20).
+        include_raw: If False, leave out the raw shared post/reel payload (shared_post_info).
+        max_age_seconds: Maximum age of mirrored messages to accept, if the inbox mirror is enabled (0 always reads from Instagram).
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
-        A dictionary with success status and the list of messages or error message.
+        A dictionary with success status, the list of messages and their source ("mirror" or "instagram"), or error message.
     """
     if not thread_id:
         return {"success": False, "message": "Thread ID must be provided."}
     try:
-        messages = client.direct_messages(thread_id, amount)
-        result_msgs = []
-        for m in messages:
-            msg = m.dict() if hasattr(m, 'dict') else (m if isinstance(m, dict) else {})
-            # Expose item_type and shared post/reel info if present
-            item_type = getattr(m, 'item_type', None) or msg.get('item_type')
-            shared_info = None
-            shared_url = None
-            shared_code = None
-            if item_type in ["clip", "media_share", "reel_share", "xma_media_share", "post_share"]:
-                # Try to extract code/url from known attributes
-                clip = getattr(m, 'clip', None) or msg.get('clip')
-                media_share = getattr(m, 'media_share', None) or msg.get('media_share')
-                xma = getattr(m, 'xma_media_share', None) or msg.get('xma_media_share')
-                post_share = getattr(m, 'post_share', None) or msg.get('post_share')
-                # Try to get code/url from any of these
-                for obj in [clip, media_share, xma, post_share]:
-                    if obj:
-                        shared_code = obj.get('code') or obj.get('pk')
-                        shared_url = obj.get('url') or (f"https://www.instagram.com/reel/{shared_code}/" if shared_code else None)
-                        shared_info = obj
-                        break
-            msg['item_type'] = item_type
-            msg['shared_post_info'] = shared_info
-            msg['shared_post_url'] = shared_url
-            msg['shared_post_code'] = shared_code
-            result_msgs.append(msg)
-        return {"success": True, "messages": result_msgs}
+        active = _active_mirror()
+        messages = active.messages(thread_id, amount, max_age_seconds) if active is not None else None
+        source = "mirror"
+        if messages is None:
+            messages, source = _message_index().fetch(thread_id, amount), "instagram"
+        return {"success": True, "messages": [_message_summary(m, include_raw) for m in messages], "source": source}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 
 @mcp.tool()
-def mark_message_seen(thread_id: str, message_id: str) -> Dict[str, Any]:
+@_blocking_tool
+def mark_message_seen(thread_id: str, message_id: str, account: Optional[str] = None) -> Dict[str, Any]:
     """Mark a message as seen in a direct message thread.
 
     Args:
         thread_id: The thread ID containing the message.
         message_id: The ID of the message to mark as seen.
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary with success status and a status message.
     """
@@ -236,45 +858,70 @@ def mark_message_seen(thread_id: str, message_id: str) -> Dict[str, Any]:
 
 
 @mcp.tool()
-def list_pending_chats(amount: int = 20) -> Dict[str, Any]:
+@_blocking_tool
+def list_pending_chats(amount: int = 20, fields: Optional[List[str]] = None, compact: bool = False, account: Optional[str] = None) -> Dict[str, Any]:
     """Get Instagram Direct Message threads (chats) from the user's pending inbox.
 
     Args:
         amount: Number of pending threads to fetch (default 20).
+        fields: If provided, return only these fields for each thread (dotted paths select nested fields).
+        compact: If True, drop empty values and cap the response size, marking it as truncated.
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary with success status and the list of pending threads or error message.
     """
     try:
         threads = client.direct_pending_inbox(amount)
-        return {"success": True, "threads": [t.dict() if hasattr(t, 'dict') else str(t) for t in threads]}
+        return _serialize_list("threads", threads, fields, compact)
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 
 @mcp.tool()
-def search_threads(query: str) -> Dict[str, Any]:
+@_blocking_tool
+def search_threads(
+    query: str,
+    fields: Optional[List[str]] = None,
+    compact: bool = False,
+    max_age_seconds: int = MIRROR_MAX_AGE,
+    account: Optional[str] = None,
+) -> Dict[str, Any]:
     """Search Instagram Direct Message threads by username or keyword.
 
+    When the inbox mirror is enabled and fresh, mirrored threads are searched by title, participant
+    username and full name first; Instagram is only asked when the mirror has no match.
+
     Args:
         query: The search term (username or keyword).
+        fields: If provided, return only these fields for each result (dotted paths select nested fields).
+        compact: If True, drop empty values and cap the response size, marking it as truncated.
+        max_age_seconds: Maximum age of the mirror to accept (0 always searches on Instagram).
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
-        A dictionary with success status and the search results or error message.
+        A dictionary with success status, the search results and their source ("mirror" or "instagram"), or error message.
     """
     if not query:
         return {"success": False, "message": "Query must be provided."}
     try:
-        results = client.direct_search(query)
-        return {"success": True, "results": [r.dict() if hasattr(r, 'dict') else str(r) for r in results]}
+        results = _active_mirror().search(query) if _mirror_fresh(max_age_seconds) else []
+        source = "mirror"
+        if not results:
+            results, source = client.direct_search(query), "instagram"
+        response = _serialize_list("results", results, fields, compact)
+        response["source"] = source
+        return response
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 
 @mcp.tool()
-def get_thread_by_participants(user_ids: List[int]) -> Dict[str, Any]:
+@_blocking_tool
+def get_thread_by_participants(user_ids: List[int], account: Optional[str] = None) -> Dict[str, Any]:
     """Get an Instagram Direct Message thread by participant user IDs.
 
     Args:
         user_ids: List of user IDs (ints).
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary with success status and the thread or error message.
     """
@@ -282,43 +929,68 @@ def get_thread_by_participants(user_ids: List[int]) -> Dict[str, Any]:
         return {"success": False, "message": "user_ids must be a non-empty list of user IDs."}
     try:
         thread = client.direct_thread_by_participants(user_ids)
-        return {"success": True, "thread": thread.dict() if hasattr(thread, 'dict') else str(thread)}
+        return {"success": True, "thread": _project(thread)}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 
 @mcp.tool()
-def get_thread_details(thread_id: str, amount: int = 20) -> Dict[str, Any]:
+@_blocking_tool
+def get_thread_details(
+    thread_id: str,
+    amount: int = 20,
+    fields: Optional[List[str]] = None,
+    compact: bool = False,
+    max_age_seconds: int = MIRROR_MAX_AGE,
+    account: Optional[str] = None,
+) -> Dict[str, Any]:
     """Get details and messages for a specific Instagram Direct Message thread by thread ID, with an optional message limit.
 
     Args:
         thread_id: The thread ID to fetch details for.
         amount: Number of messages to fetch (default 20).
+        fields: If provided, return only these thread fields (dotted paths such as "messages.text" select nested fields).
+        compact: If True, drop empty values and cap the size of the messages list, marking it as truncated.
+        max_age_seconds: Maximum age of mirrored data to accept, if the inbox mirror is enabled (0 always reads from Instagram).
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
-        A dictionary with success status and the thread details or error message.
+        A dictionary with success status, the thread details and their source ("mirror" or "instagram"), or error message.
     """
     if not thread_id:
         return {"success": False, "message": "Thread ID must be provided."}
     try:
-        thread = client.direct_thread(thread_id, amount)
-        return {"success": True, "thread": thread.dict() if hasattr(thread, 'dict') else str(thread)}
+        active = _active_mirror()
+        thread = active.thread(thread_id, amount, max_age_seconds) if active is not None else None
+        source = "mirror"
+        if thread is None:
+            thread, source = client.direct_thread(thread_id, amount), "instagram"
+            _message_index().record(thread_id, thread.messages or [])
+        details = _project(thread, _field_tree(fields), compact)
+        response = {"success": True, "thread": details, "source": source}
+        if compact and isinstance(details.get("messages"), list):
+            capped = _cap_items(details["messages"])
+            details["messages"] = capped["items"]
+            response.update(truncated=capped["truncated"], omitted=capped["omitted"])
+        return response
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 
 @mcp.tool()
-def get_user_id_from_username(username: str) -> Dict[str, Any]:
+@_blocking_tool
+def get_user_id_from_username(username: str, account: Optional[str] = None) -> Dict[str, Any]:
     """Get the Instagram user ID for a given username.
 
     Args:
         username: Instagram username.
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary with success status and the user ID or error message.
     """
     if not username:
         return {"success": False, "message": "Username must be provided."}
     try:
-        user_id = client.user_id_from_username(username)
+        user_id = _resolve_user_id(username)
         if user_id:
             return {"success": True, "user_id": user_id}
         else:
@@ -328,11 +1000,52 @@ def get_user_id_from_username(username: str) -> Dict[str, Any]:
 
 
 @mcp.tool()
-def get_username_from_user_id(user_id: str) -> Dict[str, Any]:
+def get_cache_stats() -> Dict[str, Any]:
+    """Get hit/miss counters of the server's username resolution and media download caches, the logged-in
+    accounts, and how many user lookups were coalesced into an identical in-flight or recent request.
+
+    Returns:
+        A dictionary with success status and cache statistics.
+    """
+    return {
+        "success": True,
+        "user_id_cache": user_cache.stats(),
+        "media_cache": media_cache.stats(),
+        "clients": client_pool.stats(),
+        "single_flight": single_flight.stats(),
+    }
+
+
+@mcp.tool()
+def get_throttle_state(account: Optional[str] = None) -> Dict[str, Any]:
+    """Get the rate-limit state of Instagram accounts: whether calls are paused after Instagram rate
+    limited the account (and for how long), the current concurrency limit and pacing interval, and
+    call counters.
+
+    Args:
+        account: Instagram account to report on (default: every account that has made calls).
+
+    Returns:
+        A dictionary with success status and the throttle state of each account.
+    """
+    with _throttles_lock:
+        throttles = dict(_throttles)
+    if account:
+        throttle = throttles.get(account.lstrip("@"))
+        if throttle is None:
+            return {"success": False, "message": f"Account '{account}' has not made any Instagram calls yet."}
+        throttles = {throttle.name: throttle}
+    return {"success": True, "throttles": {name: throttle.state() for name, throttle in throttles.items()}}
+
+
+@mcp.tool()
+@_blocking_tool
+def get_username_from_user_id(user_id: str, account: Optional[str] = None) -> Dict[str, Any]:
     """Get the Instagram username for a given user ID.
 
     Args:
         user_id: Instagram user ID.
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary with success status and the username or error message.
     """
@@ -349,11 +1062,13 @@ def get_username_from_user_id(user_id: str) -> Dict[str, Any]:
 
 
 @mcp.tool()
-def get_user_info(username: str) -> Dict[str, Any]:
+@_blocking_tool
+def get_user_info(username: str, account: Optional[str] = None) -> Dict[str, Any]:
     """Get detailed information about an Instagram user.
 
     Args:
         username: Instagram username to get information about.
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary with success status and user information.
     """
@@ -361,7 +1076,7 @@ def get_user_info(username: str) -> Dict[str, Any]:
         return {"success": False, "message": "Username must be provided."}
     
     try:
-        user = client.user_info_by_username(username)
+        user = _coalesced("user_info", username.lstrip("@").lower(), lambda: client.user_info_by_username(username))
         if user:
             user_data = {
                 "user_id": str(user.pk),
@@ -385,11 +1100,14 @@ def get_user_info(username: str) -> Dict[str, Any]:
 
 
 @mcp.tool()
-def check_user_online_status(usernames: List[str]) -> Dict[str, Any]:
+@_blocking_tool
+def check_user_online_status(usernames: List[str], max_age_seconds: int = PRESENCE_CACHE_TTL, account: Optional[str] = None) -> Dict[str, Any]:
     """Check the online status of Instagram users.
 
     Args:
         usernames: List of Instagram usernames to check status for.
+        max_age_seconds: Reuse presence fetched within this many seconds (default 30, 0 to always refetch).
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary with success status and users' presence information.
     """
@@ -397,42 +1115,71 @@ def check_user_online_status(usernames: List[str]) -> Dict[str, Any]:
         return {"success": False, "message": "A list of usernames must be provided."}
     
     try:
-        user_ids = []
+        # Get user IDs for the usernames, concurrently and through the shared cache
+        resolved = _resolve_many(usernames)
         username_to_id = {}
+        not_found = []
+        errors = {}
+        for username, user_id in resolved.items():
+            if isinstance(user_id, Exception):
+                logger.warning(f"Could not resolve '{username}': {user_id}")
+                errors[username] = str(user_id)
+            elif user_id:
+                username_to_id[username] = str(user_id)
+            else:
+                not_found.append(username)
         
-        # Get user IDs for the usernames
-        for username in usernames:
-            try:
-                user_id = client.user_id_from_username(username)
-                if user_id:
-                    user_ids.append(int(user_id))
-                    username_to_id[user_id] = username
-            except:
-                continue
-        
-        if not user_ids:
-            return {"success": False, "message": "No valid users found."}
+        if not username_to_id:
+            return {"success": False, "message": "No valid users found.", "not_found": not_found, "errors": errors}
         
-        presence_data = client.direct_users_presence(user_ids)
+        # Serve recent presence from the cache and look the rest up in API-sized batches
+        now = time.monotonic()
+        acting = _acting_account()
+        presence_by_id = {}
+        stale_ids = []
+        with _presence_lock:
+            for user_id in dict.fromkeys(username_to_id.values()):
+                cached = _presence_cache.get((acting, user_id))
+                if cached and now - cached[1] <= max_age_seconds:
+                    presence_by_id[user_id] = cached[0]
+                else:
+                    stale_ids.append(user_id)
+
+        for start in range(0, len(stale_ids), PRESENCE_BATCH_SIZE):
+            chunk = stale_ids[start:start + PRESENCE_BATCH_SIZE]
+            presence_data = client.direct_users_presence([int(user_id) for user_id in chunk])
+            fetched_at = time.monotonic()
+            with _presence_lock:
+                # The response envelope carries the per-user map next to "status"
+                for user_id_str, presence in presence_data.get("user_presence", {}).items():
+                    key = (acting, str(user_id_str))
+                    presence_by_id[key[1]] = presence
+                    _presence_cache[key] = (presence, fetched_at)
+                    _presence_cache.move_to_end(key)
+                while len(_presence_cache) > PRESENCE_CACHE_MAX_ENTRIES:
+                    _presence_cache.popitem(last=False)
         
         # Convert back to usernames
-        result = {}
-        for user_id_str, presence in presence_data.items():
-            username = username_to_id.get(user_id_str, f"user_{user_id_str}")
-            result[username] = presence
+        result = {
+            username: presence_by_id[user_id]
+            for username, user_id in username_to_id.items()
+            if user_id in presence_by_id
+        }
         
-        return {"success": True, "presence_data": result}
+        return {"success": True, "presence_data": result, "not_found": not_found, "errors": errors}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 
 @mcp.tool()
-def search_users(query: str) -> Dict[str, Any]:
+@_blocking_tool
+def search_users(query: str, account: Optional[str] = None) -> Dict[str, Any]:
     """Search for Instagram users by name or username.
 
     Args:
         query: Search term (name or username).
         count: Maximum number of users to return (default 10, max 50).
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary with success status and search results.
     """
@@ -460,11 +1207,13 @@ def search_users(query: str) -> Dict[str, Any]:
 
 
 @mcp.tool()
-def get_user_stories(username: str) -> Dict[str, Any]:
+@_blocking_tool
+def get_user_stories(username: str, account: Optional[str] = None) -> Dict[str, Any]:
     """Get Instagram stories from a user.
 
     Args:
         username: Instagram username to get stories from.
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary with success status and stories information.
     """
@@ -472,11 +1221,11 @@ def get_user_stories(username: str) -> Dict[str, Any]:
         return {"success": False, "message": "Username must be provided."}
     
     try:
-        user_id = client.user_id_from_username(username)
+        user_id = _resolve_user_id(username)
         if not user_id:
             return {"success": False, "message": f"User '{username}' not found."}
         
-        stories = client.user_stories(user_id)
+        stories = _coalesced("user_stories", user_id, lambda: client.user_stories(user_id))
         
         story_results = []
         for story in stories:
@@ -504,12 +1253,14 @@ def get_user_stories(username: str) -> Dict[str, Any]:
 
 
 @mcp.tool()
-def like_media(media_url: str, like: bool = True) -> Dict[str, Any]:
+@_blocking_tool
+def like_media(media_url: str, like: bool = True, account: Optional[str] = None) -> Dict[str, Any]:
     """Like or unlike an Instagram post.
 
     Args:
         media_url: URL of the Instagram post.
         like: True to like, False to unlike the post.
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary with success status and a status message.
     """
@@ -537,12 +1288,14 @@ def like_media(media_url: str, like: bool = True) -> Dict[str, Any]:
 
 
 @mcp.tool()
-def get_user_followers(username: str, count: int = 20) -> Dict[str, Any]:
+@_blocking_tool
+def get_user_followers(username: str, count: int = 20, account: Optional[str] = None) -> Dict[str, Any]:
     """Get followers of an Instagram user.
 
     Args:
         username: Instagram username to get followers for.
         count: Maximum number of followers to return (default 20).
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary with success status and followers list.
     """
@@ -550,7 +1303,7 @@ def get_user_followers(username: str, count: int = 20) -> Dict[str, Any]:
         return {"success": False, "message": "Username must be provided."}
     
     try:
-        user_id = client.user_id_from_username(username)
+        user_id = _resolve_user_id(username)
         if not user_id:
             return {"success": False, "message": f"User '{username}' not found."}
         
@@ -573,12 +1326,14 @@ def get_user_followers(username: str, count: int = 20) -> Dict[str, Any]:
 
 
 @mcp.tool()
-def get_user_following(username: str, count: int = 20) -> Dict[str, Any]:
+@_blocking_tool
+def get_user_following(username: str, count: int = 20, account: Optional[str] = None) -> Dict[str, Any]:
     """Get users that an Instagram user is following.
 
     Args:
         username: Instagram username to get following list for.
         count: Maximum number of following to return (default 20).
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary with success status and following list.
     """
@@ -586,7 +1341,7 @@ def get_user_following(username: str, count: int = 20) -> Dict[str, Any]:
         return {"success": False, "message": "Username must be provided."}
     
     try:
-        user_id = client.user_id_from_username(username)
+        user_id = _resolve_user_id(username)
         if not user_id:
             return {"success": False, "message": f"User '{username}' not found."}
         
@@ -609,12 +1364,14 @@ def get_user_following(username: str, count: int = 20) -> Dict[str, Any]:
 
 
 @mcp.tool()
-def get_user_posts(username: str, count: int = 12) -> Dict[str, Any]:
+@_blocking_tool
+def get_user_posts(username: str, count: int = 12, account: Optional[str] = None) -> Dict[str, Any]:
     """Get recent posts from an Instagram user.
 
     Args:
         username: Instagram username to get posts from.
         count: Maximum number of posts to return (default 12).
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary with success status and posts list.
     """
@@ -622,7 +1379,7 @@ def get_user_posts(username: str, count: int = 12) -> Dict[str, Any]:
         return {"success": False, "message": "Username must be provided."}
     
     try:
-        user_id = client.user_id_from_username(username)
+        user_id = _resolve_user_id(username)
         if not user_id:
             return {"success": False, "message": f"User '{username}' not found."}
         
@@ -657,34 +1414,56 @@ def _ensure_download_directory(download_path: str) -> None:
 
 
 def _download_single_media(media, download_path: str) -> str:
-    """Download a single media item and return the file path."""
+    """Download a single media item through the shared media cache and return the file path.
+
+    Feed media and album items have a pk, so a missing URL can be looked up again with media_info.
+    Media sent in a DM (DirectMedia) only has an id that media_info does not know; its URLs on the
+    message are the only way to download it.
+    """
     media_type = media.media_type
-    if media_type == 1:  # Photo
-        return str(client.photo_download(media.pk, download_path))
-    elif media_type == 2:  # Video
-        return str(client.video_download(media.pk, download_path))
-    else:
+    if media_type not in (1, 2):
         raise ValueError(f"Unsupported media type: {media_type}")
+    pk = getattr(media, "pk", None)
+    key = str(pk or media.id)
+    cached = media_cache.get(key)
+    if cached is None:
+        url = media.thumbnail_url if media_type == 1 else media.video_url
+        if not url:
+            if not pk:
+                raise ValueError(f"Direct media {media.id} has no download URL (it may be view-once or expired).")
+            info = client.media_info(pk)
+            url = info.thumbnail_url if media_type == 1 else info.video_url
+        cached = media_cache.fetch(key, str(url), ".jpg" if media_type == 1 else ".mp4")
+    return media_cache.materialize(cached, download_path)
+
+
+def _download_album(media, download_path: str, max_workers: int = DOWNLOAD_WORKERS) -> List[str]:
+    """Download every item of an album concurrently through the shared media cache."""
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(media.resources)))) as pool:
+        paths = list(pool.map(_in_context(lambda resource: _download_single_media(resource, download_path)), media.resources))
+    media_cache.put_album(media.pk, [resource.pk for resource in media.resources])
+    return paths
 
 
 def _find_message_in_thread(thread_id: str, message_id: str):
-    """Find a specific message in a thread."""
-    messages = client.direct_messages(thread_id, 100)
-    return next((m for m in messages if str(m.id) == message_id), None)
+    """Find a specific message in a thread through the shared message index."""
+    return _message_index().find(thread_id, message_id)
 
 
 @mcp.tool()
-def list_media_messages(thread_id: str, limit: int = 100) -> Dict[str, Any]:
+@_blocking_tool
+def list_media_messages(thread_id: str, limit: int = 100, account: Optional[str] = None) -> Dict[str, Any]:
     """List all messages containing media in an Instagram direct message thread.
     Args:
         thread_id: The ID of the thread to check for media messages
         limit: Maximum number of messages to check (default 100, max 200)
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary containing success status and list of all media messages found
     """
     try:
         limit = min(limit, 200)
-        messages = client.direct_messages(thread_id, limit)
+        messages = _message_index().fetch(thread_id, limit)
         media_messages = []
         for message in messages:
             if message.media:
@@ -707,12 +1486,14 @@ def list_media_messages(thread_id: str, limit: int = 100) -> Dict[str, Any]:
         }
 
 @mcp.tool()
-def download_media_from_message(message_id: str, thread_id: str, download_path: str = "./downloads") -> Dict[str, Any]:
+@_blocking_tool
+def download_media_from_message(message_id: str, thread_id: str, download_path: str = "./downloads", account: Optional[str] = None) -> Dict[str, Any]:
     """Download media from a specific Instagram direct message and get the local file path.
     Args:
         message_id: The ID of the message containing the media
         thread_id: The ID of the thread containing the message
         download_path: Directory to save the downloaded file (default: ./downloads)
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary containing success status, a status message, and the file path if successful
     """
@@ -746,12 +1527,61 @@ def download_media_from_message(message_id: str, thread_id: str, download_path:
 
 
 @mcp.tool()
-def download_shared_post_from_message(message_id: str, thread_id: str, download_path: str = "./downloads") -> Dict[str, Any]:
+@_blocking_tool
+def download_thread_media(thread_id: str, limit: int = 100, download_path: str = "./downloads", max_workers: int = DOWNLOAD_WORKERS, account: Optional[str] = None) -> Dict[str, Any]:
+    """Download all direct-uploaded media (photos/videos) found in the latest messages of a thread.
+    Args:
+        thread_id: The ID of the thread to download media from
+        limit: Maximum number of messages to check (default 100, max 200)
+        download_path: Directory to save the downloaded files (default: ./downloads)
+        max_workers: Number of parallel downloads (default 4, max 8)
+        account: Instagram account to act as (default: the account the server was started with).
+    Returns:
+        A dictionary containing success status and one result (file path or error) per media message
+    """
+    try:
+        _ensure_download_directory(download_path)
+        messages = _message_index().fetch(thread_id, min(limit, 200))
+        media_messages = [m for m in messages if m.media]
+
+        def download(message):
+            try:
+                return {
+                    "message_id": str(message.id),
+                    "success": True,
+                    "file_path": _download_single_media(message.media, download_path),
+                    "media_type": "photo" if message.media.media_type == 1 else "video",
+                }
+            except Exception as e:
+                return {"message_id": str(message.id), "success": False, "message": str(e)}
+
+        workers = max(1, min(max_workers, MAX_DOWNLOAD_WORKERS, len(media_messages) or 1))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_in_context(download), media_messages))
+        downloaded = sum(1 for r in results if r["success"])
+        return {
+            "success": True,
+            "message": f"Downloaded {downloaded} of {len(media_messages)} media messages",
+            "total_messages_checked": len(messages),
+            "results": results,
+            "thread_id": thread_id
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"Failed to download thread media: {str(e)}"
+        }
+
+
+@mcp.tool()
+@_blocking_tool
+def download_shared_post_from_message(message_id: str, thread_id: str, download_path: str = "./downloads", account: Optional[str] = None) -> Dict[str, Any]:
     """Download media from a shared post/reel/clip in a DM message and get the local file path.
     Args:
         message_id: The ID of the message containing the shared post/reel/clip
         thread_id: The ID of the thread containing the message
         download_path: Directory to save the downloaded file (default: ./downloads)
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary containing success status, a status message, and the file path if successful
     """
@@ -760,38 +1590,37 @@ def download_shared_post_from_message(message_id: str, thread_id: str, download_
         target_message = _find_message_in_thread(thread_id, message_id)
         if not target_message:
             return {"success": False, "message": f"Message {message_id} not found in thread {thread_id}"}
-        item_type = getattr(target_message, 'item_type', None)
         # Extract shared post/reel/clip URL
-        shared_url = None
-        shared_code = None
-        shared_obj = None
-        if item_type in ["clip", "media_share", "reel_share", "xma_media_share", "post_share"]:
-            for attr in ['clip', 'media_share', 'xma_media_share', 'post_share']:
-                obj = getattr(target_message, attr, None)
-                if obj:
-                    shared_code = obj.get('code') or obj.get('pk')
-                    shared_url = obj.get('url') or (f"https://www.instagram.com/reel/{shared_code}/" if shared_code else None)
-                    shared_obj = obj
-                    break
+        _, shared_url, _ = _shared_post(target_message)
         if not shared_url:
             return {"success": False, "message": "This message does not contain a supported shared post/reel/clip"}
         # Download using Instagrapi
         try:
             media_pk = client.media_pk_from_url(shared_url)
-            media = client.media_info(media_pk)
-            if media.media_type == 1:
-                file_path = str(client.photo_download(media_pk, download_path))
-                media_type = "photo"
-            elif media.media_type == 2:
-                file_path = str(client.video_download(media_pk, download_path))
-                media_type = "video"
-            elif media.media_type == 8:  # album
-                # Download all items in album
-                album_paths = client.album_download(media_pk, download_path)
-                file_path = str(album_paths)
+            cached = media_cache.get(media_pk)
+            album = None if cached else media_cache.get_album(media_pk)
+            if cached:
+                # Same post already downloaded, possibly from another thread
+                file_path = media_cache.materialize(cached, download_path)
+                media_type = media_cache.media_type_of(cached)
+            elif album:
+                file_path = str([media_cache.materialize(item, download_path) for item in album])
                 media_type = "album"
             else:
-                return {"success": False, "message": f"Unsupported media type: {media.media_type}"}
+                media = client.media_info(media_pk)
+                if media.media_type == 1:
+                    file_path = _download_single_media(media, download_path)
+                    media_type = "photo"
+                elif media.media_type == 2:
+                    file_path = _download_single_media(media, download_path)
+                    media_type = "video"
+                elif media.media_type == 8:  # album
+                    # Download all items in album
+                    album_paths = _download_album(media, download_path)
+                    file_path = str(album_paths)
+                    media_type = "album"
+                else:
+                    return {"success": False, "message": f"Unsupported media type: {media.media_type}"}
             return {
                 "success": True,
                 "message": "Shared post/reel/clip downloaded successfully",
@@ -808,12 +1637,14 @@ def download_shared_post_from_message(message_id: str, thread_id: str, download_
 
 
 @mcp.tool()
-def delete_message(thread_id: str, message_id: str) -> Dict[str, Any]:
+@_blocking_tool
+def delete_message(thread_id: str, message_id: str, account: Optional[str] = None) -> Dict[str, Any]:
     """Delete a message from a direct message thread.
 
     Args:
         thread_id: The thread ID containing the message.
         message_id: The ID of the message to delete.
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary with success status and a status message.
     """
@@ -822,6 +1653,8 @@ def delete_message(thread_id: str, message_id: str) -> Dict[str, Any]:
     
     try:
         result = client.direct_message_delete(int(thread_id), int(message_id))
+        if result and _active_mirror() is not None:
+            _active_mirror().delete_message(thread_id, message_id)
         if result:
             return {"success": True, "message": "Message deleted successfully."}
         else:
@@ -831,12 +1664,14 @@ def delete_message(thread_id: str, message_id: str) -> Dict[str, Any]:
 
 
 @mcp.tool()
-def mute_conversation(thread_id: str, mute: bool = True) -> Dict[str, Any]:
+@_blocking_tool
+def mute_conversation(thread_id: str, mute: bool = True, account: Optional[str] = None) -> Dict[str, Any]:
     """Mute or unmute a direct message conversation.
 
     Args:
         thread_id: The thread ID to mute/unmute.
         mute: True to mute, False to unmute the conversation.
+        account: Instagram account to act as (default: the account the server was started with).
     Returns:
         A dictionary with success status and a status message.
     """
@@ -850,6 +1685,8 @@ def mute_conversation(thread_id: str, mute: bool = True) -> Dict[str, Any]:
         else:
             result = client.direct_thread_unmute(int(thread_id))
             action = "unmuted"
+        if result and _active_mirror() is not None:
+            _active_mirror().update_thread(thread_id, muted=mute)
         
         if result:
             return {"success": True, "message": f"Conversation {action} successfully."}
@@ -859,59 +1696,48 @@ def mute_conversation(thread_id: str, mute: bool = True) -> Dict[str, Any]:
         return {"success": False, "message": str(e)}
 
 
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--username", type=str, help="Instagram username (can also be set via INSTAGRAM_USERNAME env var)")
+    parser.add_argument("--password", type=str, help="Instagram password (can also be set via INSTAGRAM_PASSWORD env var)")
+    parser.add_argument("--code", type=str, help="Instagram 2FA verification code (can also be set via INSTAGRAM_VERIFICATION_CODE env var)")
+    parser.add_argument("--mirror-db", type=str, help="Keep a local SQLite mirror of the inbox in this file and serve reads from it (can also be set via INSTAGRAM_MIRROR_DB env var)")
+    return parser
+
+
+def prepare(args: argparse.Namespace) -> None:
+    """Configure the default account and optional features. Makes no request to Instagram.
+
+    The default account logs in on the first tool call, reusing its saved session when it is still
+    usable, so the server is ready to serve as soon as the tools are registered.
+    """
+    # Get credentials from environment variables or command line arguments
+    username = args.username or os.getenv("INSTAGRAM_USERNAME")
+    password = args.password or os.getenv("INSTAGRAM_PASSWORD")
+
+    # A saved session is enough to start; the password is only needed when it has to log in again
+    if not username or not (password or session_file(username, client_pool.session_dir).exists()):
+        logger.error("Instagram credentials not provided. Please set INSTAGRAM_USERNAME and INSTAGRAM_PASSWORD environment variables in a .env file, or provide --username and --password arguments.")
+        print("Error: Instagram credentials not provided.")
+        print("Please either:")
+        print("1. Create a .env file with INSTAGRAM_USERNAME and INSTAGRAM_PASSWORD")
+        print("2. Use --username and --password command line arguments")
+        exit(1)
+
+    verification_code = args.code or os.getenv("INSTAGRAM_VERIFICATION_CODE")
+    if verification_code:
+        _verification_codes[username.lstrip("@")] = verification_code
+    client_pool.set_default(username, password)
+
+    mirror_db = args.mirror_db or os.getenv("INSTAGRAM_MIRROR_DB")
+    if mirror_db:
+        start_inbox_mirror(mirror_db)
+
+
+def main() -> None:
+    prepare(build_parser().parse_args())
+    mcp.run(transport="stdio")
+
+
 if __name__ == "__main__":
-   parser = argparse.ArgumentParser()
-   parser.add_argument("--username", type=str, help="Instagram username (can also be set via INSTAGRAM_USERNAME env var)")
-   parser.add_argument("--password", type=str, help="Instagram password (can also be set via INSTAGRAM_PASSWORD env var)")
-   parser.add_argument("--code", type=str, help="Instagram 2FA verification code (can also be set via INSTAGRAM_VERIFICATION_CODE env var)")
-   args = parser.parse_args()
-
-   # Get credentials from environment variables or command line arguments
-   username = args.username or os.getenv("INSTAGRAM_USERNAME")
-   password = args.password or os.getenv("INSTAGRAM_PASSWORD")
-
-   if not username or not password:
-       logger.error("Instagram credentials not provided. Please set INSTAGRAM_USERNAME and INSTAGRAM_PASSWORD environment variables in a .env file, or provide --username and --password arguments.")
-       print("Error: Instagram credentials not provided.")
-       print("Please either:")
-       print("1. Create a .env file with INSTAGRAM_USERNAME and INSTAGRAM_PASSWORD")
-       print("2. Use --username and --password command line arguments")
-       exit(1)
-
-   try:
-       logger.info("Attempting to login to Instagram...")
-       
-       # CRITICAL FIX: Session file handling for persistent authentication
-       # Without this, Instagram login hangs due to rate limiting and security measures
-       # Session files allow Instagram to recognize the client and avoid fresh authentication
-       # This prevents the MCP server from hanging after "🚀 Attempting to send DM"
-       SESSION_FILE = Path(f"{username}_session.json")
-       if SESSION_FILE.exists():
-           logger.info(f"Loading existing session from {SESSION_FILE}")
-           client.load_settings(SESSION_FILE)
-       
-       try:
-           client.login(username, password)
-       except TwoFactorRequired as e:
-           verification_code = args.code or os.getenv("INSTAGRAM_VERIFICATION_CODE")
-           if not verification_code:
-               logger.error("Two-factor authentication required but no verification code provided.")
-               print("Error: 2FA requerido. Proporciona el código con --code o variable INSTAGRAM_VERIFICATION_CODE")
-               exit(1)
-           # Retry login providing verification_code
-           client.login(
-               username,
-               password,
-               verification_code=verification_code,
-           )
-       
-       # Save session for future use to avoid repeated fresh authentication
-       client.dump_settings(SESSION_FILE)
-       logger.info(f"Session saved to {SESSION_FILE}")
-       
-       logger.info("Successfully logged in to Instagram")
-       mcp.run(transport="stdio")
-   except Exception as e:
-       logger.error(f"Failed to login to Instagram: {str(e)}")
-       print(f"Error: Failed to login to Instagram - {str(e)}")
-       exit(1)
+    main()
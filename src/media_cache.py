@@ -0,0 +1,141 @@
+import os
+import shutil
+import tempfile
+import threading
+import logging
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Extensions the cache stores, and the media type they correspond to
+SUFFIX_MEDIA_TYPES = {".jpg": "photo", ".mp4": "video"}
+
+# Downloads of the same pk are serialized by one of this many locks, picked by hashing the pk
+KEY_LOCK_STRIPES = 64
+
+
+class MediaCache:
+    """Content-addressed download cache for Instagram media, keyed by media pk.
+
+    Files live in one directory as <pk><suffix>. Downloads stream to a temporary file in the same
+    directory and are renamed into place, so a crash never leaves a truncated file under a valid
+    name. When the directory grows past max_bytes the least recently used files are deleted. Albums
+    are stored as their items plus a small <pk>.album file listing the item pks.
+    """
+
+    def __init__(self, root, max_bytes=1024 * 1024 * 1024, timeout=60):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._entries = OrderedDict()  # pk -> (path, size), least recently used first
+        self._total = 0
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(KEY_LOCK_STRIPES)]
+        self.hits = 0
+        self.misses = 0
+
+        files = [p for p in self.root.iterdir() if p.is_file() and p.suffix in SUFFIX_MEDIA_TYPES]
+        for path in sorted(files, key=lambda p: p.stat().st_mtime):
+            size = path.stat().st_size
+            self._entries[path.stem] = (path, size)
+            self._total += size
+
+    def _key_lock(self, key):
+        return self._key_locks[hash(key) % len(self._key_locks)]
+
+    def get(self, key):
+        """Returns the cached file for a media pk, or None."""
+        key = str(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry[0].exists():
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        os.utime(entry[0])
+        return entry[0]
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            key, (path, size) = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            logger.debug(f"Evicted {key} from the media cache.")
+
+    def fetch(self, key, url, suffix):
+        """Returns the cached file for a media pk, downloading it from url on a miss."""
+        key = str(key)
+        with self._key_lock(key):
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+
+            import requests  # Only needed on a miss; keeps it out of the server's startup path
+
+            final_path = self.root / f"{key}{suffix}"
+            fd, tmp_name = tempfile.mkstemp(dir=self.root, prefix=f".{key}-", suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as tmp, requests.get(url, stream=True, timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        tmp.write(chunk)
+                os.replace(tmp_name, final_path)
+            except BaseException:
+                if os.path.exists(tmp_name):
+                    os.unlink(tmp_name)
+                raise
+
+            size = final_path.stat().st_size
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = (final_path, size)
+                self._total += size
+                self._evict()
+            return final_path
+
+    def put_album(self, key, child_keys):
+        """Records which media pks make up an album, so a repeat download can be served from the cache."""
+        path = self.root / f"{key}.album"
+        tmp_path = path.with_name(f".{path.name}.part")
+        tmp_path.write_text("\n".join(str(child) for child in child_keys))
+        os.replace(tmp_path, path)
+
+    def get_album(self, key):
+        """Returns the cached files of an album's items in order, or None unless all of them are cached."""
+        try:
+            child_keys = (self.root / f"{key}.album").read_text().split()
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if not child_keys or any(child not in self._entries for child in child_keys):
+                return None
+        files = [self.get(child) for child in child_keys]
+        return None if None in files else files
+
+    @staticmethod
+    def media_type_of(path):
+        """Returns 'photo' or 'video' for a cached file."""
+        return SUFFIX_MEDIA_TYPES.get(Path(path).suffix)
+
+    @staticmethod
+    def materialize(cached_path, download_path):
+        """Places a cached file in download_path (hard link when possible) and returns the new path."""
+        target = Path(download_path) / Path(cached_path).name
+        if target.exists() and target.stat().st_size == Path(cached_path).stat().st_size:
+            return str(target)
+        tmp_target = target.with_name(f".{target.name}.part")
+        try:
+            os.link(cached_path, tmp_target)
+        except OSError:
+            shutil.copy2(cached_path, tmp_target)
+        os.replace(tmp_target, target)
+        return str(target)
+
+    def stats(self):
+        with self._lock:
+            return {"files": len(self._entries), "bytes": self._total, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,105 @@
+import threading
+from collections import OrderedDict
+
+
+class _ThreadEntry:
+    def __init__(self):
+        self.messages = {}
+        self.oldest_cursor = None  # Cursor of the next older page, None if not paged yet
+        self.depth = 0  # How many pages from the top oldest_cursor points past
+        self.exhausted = False  # True once the oldest page of the thread has been read
+
+
+class MessageIndex:
+    """Per-thread message-id index shared by the message and download tools.
+
+    Every page of messages fetched through the index is remembered, so looking a message up by id
+    after list_messages or list_media_messages is a dict lookup. On a miss the index first re-reads
+    the newest page (for messages that arrived since) and then pages backwards from where earlier
+    fetches stopped, one page at a time, instead of refetching the thread from the top.
+
+    `fetch_page(thread_id, cursor)` must return (messages newest first, cursor of the next older page
+    or None at the start of the thread).
+    """
+
+    def __init__(self, fetch_page, max_threads=200, max_messages_per_thread=5000, max_pages_per_lookup=25):
+        self.fetch_page = fetch_page
+        self.max_threads = max_threads
+        self.max_messages_per_thread = max_messages_per_thread
+        self.max_pages_per_lookup = max_pages_per_lookup
+        self._threads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, thread_id):
+        entry = self._threads.get(thread_id)
+        if entry is None:
+            entry = self._threads[thread_id] = _ThreadEntry()
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+        self._threads.move_to_end(thread_id)
+        return entry
+
+    def _record_page(self, thread_id, messages, cursor, depth):
+        with self._lock:
+            entry = self._entry(thread_id)
+            if len(entry.messages) + len(messages) > self.max_messages_per_thread:
+                # Start over rather than leave gaps between indexed messages and the stored cursor
+                entry = self._threads[thread_id] = _ThreadEntry()
+            for message in messages:
+                entry.messages[str(message.id)] = message
+            # Only move the frontier further back, never towards the top
+            if depth >= entry.depth:
+                entry.depth = depth
+                entry.oldest_cursor = cursor
+                entry.exhausted = cursor is None
+
+    def record(self, thread_id, messages):
+        """Adds messages fetched elsewhere to the index."""
+        with self._lock:
+            entry = self._entry(str(thread_id))
+            for message in messages:
+                entry.messages[str(message.id)] = message
+
+    def fetch(self, thread_id, amount):
+        """Returns the newest `amount` messages of a thread, indexing every page read on the way."""
+        thread_id = str(thread_id)
+        messages = []
+        cursor = None
+        depth = 0
+        while True:
+            page, next_cursor = self.fetch_page(thread_id, cursor)
+            depth += 1
+            self._record_page(thread_id, page, next_cursor, depth)
+            messages.extend(page)
+            if not next_cursor or not page or len(messages) >= amount:
+                return messages[:amount]
+            cursor = next_cursor
+
+    def get(self, thread_id, message_id):
+        """Returns an indexed message without touching the network, or None."""
+        with self._lock:
+            entry = self._threads.get(str(thread_id))
+            return entry.messages.get(str(message_id)) if entry else None
+
+    def find(self, thread_id, message_id):
+        """Looks a message up by id, fetching only the pages needed to reach it."""
+        thread_id, message_id = str(thread_id), str(message_id)
+        message = self.get(thread_id, message_id)
+        if message is not None:
+            return message
+
+        # Newest page first, in case the message arrived after the thread was indexed
+        page, next_cursor = self.fetch_page(thread_id, None)
+        self._record_page(thread_id, page, next_cursor, 1)
+        for _ in range(self.max_pages_per_lookup):
+            message = self.get(thread_id, message_id)
+            if message is not None:
+                return message
+            with self._lock:
+                entry = self._entry(thread_id)
+                cursor, depth, exhausted = entry.oldest_cursor, entry.depth, entry.exhausted
+            if exhausted or cursor is None:
+                return None
+            page, next_cursor = self.fetch_page(thread_id, cursor)
+            self._record_page(thread_id, page, next_cursor, depth + 1)
+        return self.get(thread_id, message_id)
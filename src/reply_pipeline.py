@@ -0,0 +1,118 @@
+import time
+import threading
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyStats:
+    """Rolling window of end-to-end reply latencies, in seconds."""
+
+    def __init__(self, window=500):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self.total += 1
+
+    def snapshot(self):
+        """Returns count, mean, p50, p95 and max over the window (seconds, rounded to ms)."""
+        with self._lock:
+            samples = sorted(self._samples)
+            total = self.total
+        if not samples:
+            return {"count": total, "mean": None, "p50": None, "p95": None, "max": None}
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3)
+
+        return {
+            "count": total,
+            "mean": round(sum(samples) / len(samples), 3),
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "max": round(samples[-1], 3),
+        }
+
+
+class ReplyPipeline:
+    """Three-stage reply engine: concurrent fetches, bounded concurrent LLM calls, serialized sends.
+
+    - fetch(job) reads the thread and returns a work item, or None when no reply is needed.
+    - generate(item) returns the reply text, or None to drop the item.
+    - send(item, text) delivers the reply and raises if it could not. Sends run one at a time and at
+      least min_send_interval seconds apart, so the account's send rate is unaffected by the fan-out.
+
+    Each stage starts as soon as the previous one finishes for a given job, so the first reply goes
+    out while later threads are still being fetched or generated. Latency is measured from the
+    moment a job enters the pipeline until its reply has been sent; failed sends are neither counted
+    nor timed. Once stop_event is set, work that has not started yet is dropped, including replies
+    waiting for their send slot.
+    """
+
+    def __init__(self, fetch, generate, send, fetch_workers=4, llm_workers=4, min_send_interval=5.0, latency=None,
+                 stop_event=None):
+        self.fetch = fetch
+        self.generate = generate
+        self.send = send
+        self.fetch_workers = fetch_workers
+        self.llm_workers = llm_workers
+        self.min_send_interval = min_send_interval
+        self.latency = latency or LatencyStats()
+        self.stop_event = stop_event or threading.Event()
+        self._last_send_at = 0.0
+
+    def _unless_stopped(self, stage, item):
+        return None if self.stop_event.is_set() else stage(item)
+
+    def _paced_send(self, item, text, started_at):
+        """Sends one reply when its slot comes up. Returns False if the pipeline was stopped first."""
+        wait_for = self._last_send_at + self.min_send_interval - time.monotonic()
+        if self.stop_event.wait(max(0.0, wait_for)):
+            return False
+        try:
+            self.send(item, text)
+        finally:
+            self._last_send_at = time.monotonic()
+        self.latency.record(self._last_send_at - started_at)
+        return True
+
+    def run(self, jobs):
+        """Processes every job and returns the number of replies sent."""
+        jobs = list(jobs)
+        if not jobs:
+            return 0
+
+        sent = 0
+        with ThreadPoolExecutor(max_workers=self.fetch_workers, thread_name_prefix="reply-fetch") as fetch_pool, \
+                ThreadPoolExecutor(max_workers=self.llm_workers, thread_name_prefix="reply-llm") as llm_pool, \
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix="reply-send") as send_pool:
+            pending = {}
+            for job in jobs:
+                started_at = time.monotonic()
+                pending[fetch_pool.submit(self._unless_stopped, self.fetch, job)] = ("fetch", job, started_at)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, item, started_at = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"Reply pipeline {stage} stage failed: {e}")
+                        continue
+
+                    if stage == "fetch" and result is not None:
+                        pending[llm_pool.submit(self._unless_stopped, self.generate, result)] = ("generate", result, started_at)
+                    elif stage == "generate" and result:
+                        pending[send_pool.submit(self._paced_send, item, result, started_at)] = ("send", item, started_at)
+                    elif stage == "send" and result:
+                        sent += 1
+
+        logger.info(f"Reply pipeline sent {sent} of {len(jobs)} replies. Latency: {self.latency.snapshot()}")
+        return sent
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Shortest pause between two agent steps, in seconds
+MIN_STEP_SECONDS = 1.0
+
+
+class _AgentHandle:
+    """Runtime bookkeeping for one hosted agent."""
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.task = None
+        self.state = "starting"  # starting, running, paused, stopped, failed
+        self.error = None
+        self.paused = False
+        self.wake = asyncio.Event()
+        self.inflight = None  # concurrent Future of the blocking agent call in progress, if any
+
+
+class AgentRuntime:
+    """Hosts several InstagramAppointmentSetter agents on one asyncio event loop.
+
+    Each agent is a task that alternates between running agent.step() in a shared thread pool (the
+    instagrapi and Gemini calls are blocking) and sleeping on an event. Stop and pause requests set
+    that event, so they take effect immediately instead of after the agent's next sleep. A stop also
+    cancels the task, so no new work is started even if a step is still finishing in its worker thread.
+    """
+
+    def __init__(self, max_workers=8):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent")
+        self._agents = {}
+
+    def is_running(self, key):
+        handle = self._agents.get(key)
+        return handle is not None and handle.state in ("starting", "running", "paused")
+
+    def agent(self, key):
+        """Returns the agent hosted under `key` while it is running, else None."""
+        handle = self._agents.get(key)
+        return handle.agent if handle is not None and self.is_running(key) else None
+
+    def start(self, key, agent, **session_kwargs):
+        """Starts hosting an agent under `key`. Must be called from within the event loop."""
+        if self.is_running(key):
+            raise RuntimeError(f"Agent '{key}' is already running")
+        handle = _AgentHandle(agent)
+        handle.task = asyncio.get_running_loop().create_task(self._run(key, handle, session_kwargs))
+        self._agents[key] = handle
+        return handle
+
+    async def stop(self, key):
+        """Stops an agent without waiting for the step still running in its worker thread.
+
+        The stop event makes that step drop its remaining work; the agent's store is closed once it returns.
+        """
+        handle = self._agents.get(key)
+        if handle is None or handle.task is None:
+            return False
+        handle.agent.stop_requested.set()
+        handle.wake.set()
+        handle.task.cancel()
+        try:
+            await handle.task
+        except asyncio.CancelledError:
+            pass
+        handle.state = "stopped"
+        self._close(handle)
+        logger.info(f"Agent '{key}' stopped.")
+        return True
+
+    async def stop_all(self):
+        for key in list(self._agents):
+            if self.is_running(key):
+                await self.stop(key)
+
+    def pause(self, key):
+        """Pauses an agent after its current step; it keeps its session and queues."""
+        handle = self._agents.get(key)
+        if handle is None or not self.is_running(key):
+            return False
+        handle.paused = True
+        handle.state = "paused"
+        handle.wake.set()
+        return True
+
+    def resume(self, key):
+        handle = self._agents.get(key)
+        if handle is None or not handle.paused:
+            return False
+        handle.paused = False
+        handle.state = "running"
+        handle.wake.set()
+        return True
+
+    def status(self, key):
+        handle = self._agents.get(key)
+        if handle is None:
+            return None
+        return {
+            "state": handle.state,
+            "error": handle.error,
+            "reply_latency": handle.agent.reply_pipeline.latency.snapshot(),
+            "throttle": handle.agent.throttle.state(),
+        }
+
+    def statuses(self):
+        return {key: self.status(key) for key in self._agents}
+
+    async def _sleep(self, handle, seconds):
+        """Sleeps until the timeout or until a stop/pause/resume request wakes the agent."""
+        try:
+            await asyncio.wait_for(handle.wake.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        handle.wake.clear()
+
+    async def _call(self, handle, fn):
+        """Runs a blocking agent call in the thread pool, remembering it so _close can wait for it."""
+        handle.inflight = self.executor.submit(fn)
+        return await asyncio.wrap_future(handle.inflight)
+
+    def _close(self, handle):
+        """Closes the agent's lead store once the step still finishing in its worker thread returns."""
+        if handle.inflight is None:
+            handle.agent.store.close()
+        else:
+            # Runs right away if the call is already done
+            handle.inflight.add_done_callback(lambda _: handle.agent.store.close())
+
+    async def _run(self, key, handle, session_kwargs):
+        agent = handle.agent
+        try:
+            await self._call(handle, agent.login)
+            agent.start_session(**session_kwargs)
+            handle.state = "paused" if handle.paused else "running"
+            logger.info(f"Agent '{key}' started.")
+
+            while not agent.stop_requested.is_set():
+                if handle.paused:
+                    await self._sleep(handle, None)
+                    continue
+                delay = await self._call(handle, agent.step)
+                await self._sleep(handle, max(MIN_STEP_SECONDS, delay))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            handle.state = "failed"
+            handle.error = str(e)
+            logger.error(f"Agent '{key}' failed: {e}")
+            self._close(handle)
@@ -0,0 +1,68 @@
+import time
+import random
+from datetime import datetime, timedelta
+
+
+class SendScheduler:
+    """Spreads a daily outreach quota across the active hours with a jittered token bucket.
+
+    One token becomes available every (active window / daily limit) seconds, give or take `jitter`,
+    and at most `burst` tokens are banked. Tokens are only handed out inside the active hours, so
+    sends are paced evenly through the day instead of being fired back to back. Equal start and end
+    hours (e.g. 9-9) mean active around the clock.
+    """
+
+    def __init__(self, daily_limit, active_hours=(9, 21), burst=1, jitter=0.3):
+        start_hour, end_hour = active_hours
+        self.start_hour = start_hour
+        self.end_hour = end_hour
+        window_hours = (end_hour - start_hour) % 24 or 24
+        self.interval = window_hours * 3600 / max(daily_limit, 1)
+        self.burst = burst
+        self.jitter = jitter
+        self.tokens = burst
+        self._next_token_at = time.monotonic() + self._jittered_interval()
+
+    def _jittered_interval(self):
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _refill(self, now):
+        while now >= self._next_token_at and self.tokens < self.burst:
+            self.tokens += 1
+            self._next_token_at += self._jittered_interval()
+        if self.tokens >= self.burst and now >= self._next_token_at:
+            # Bucket is full: don't bank time that passed while nothing was being sent
+            self._next_token_at = now + self._jittered_interval()
+
+    def in_active_hours(self, when=None):
+        """Returns True if the local time falls inside the active window (which may wrap midnight)."""
+        hour = (when or datetime.now()).hour
+        if self.start_hour == self.end_hour:
+            return True
+        if self.start_hour < self.end_hour:
+            return self.start_hour <= hour < self.end_hour
+        return hour >= self.start_hour or hour < self.end_hour
+
+    def try_acquire(self):
+        """Takes a send slot if one is available right now."""
+        if not self.in_active_hours():
+            return False
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def seconds_until_next(self):
+        """Seconds until the next send slot, including the wait for the active window to open."""
+        now = datetime.now()
+        if not self.in_active_hours(now):
+            opens = now.replace(hour=self.start_hour, minute=0, second=0, microsecond=0)
+            if opens <= now:
+                opens += timedelta(days=1)
+            return (opens - now).total_seconds()
+        monotonic_now = time.monotonic()
+        self._refill(monotonic_now)
+        if self.tokens >= 1:
+            return 0.0
+        return max(0.0, self._next_token_at - monotonic_now)
@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces identical concurrent lookups into one upstream call.
+
+    The first caller for a key runs the function; callers arriving with the same key while it is in
+    flight wait for it and get the same result (or exception). Results are then kept for `ttl`
+    seconds, so a burst of calls that just misses the in-flight window is served from memory too.
+    Exceptions are shared with the waiting callers but never cached.
+    """
+
+    def __init__(self, ttl=10.0, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._inflight = {}
+        self._results = OrderedDict()  # key -> (expires_at, result), oldest first
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.upstream = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+
+    def do(self, key, fn):
+        """Returns fn() for key, sharing an in-flight or recent call with the same key."""
+        with self._lock:
+            self.calls += 1
+            cached = self._results.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self.cache_hits += 1
+                return cached[1]
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self.upstream += 1
+                del self._inflight[key]
+                if call.error is None and self.ttl > 0:
+                    self._results[key] = (time.monotonic() + self.ttl, call.result)
+                    self._results.move_to_end(key)
+                    while len(self._results) > self.maxsize:
+                        self._results.popitem(last=False)
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "upstream_calls": self.upstream,
+                "coalesced": self.coalesced,
+                "cache_hits": self.cache_hits,
+                "in_flight": len(self._inflight),
+            }
@@ -0,0 +1,206 @@
+import functools
+import random
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# instagrapi exceptions (matched by class name, so instagrapi need not be imported here) that mean
+# Instagram is limiting the account rather than rejecting one particular request
+RATE_LIMIT_ERRORS = {
+    "PleaseWaitFewMinutes",
+    "FeedbackRequired",
+    "ClientThrottledError",
+    "RateLimitError",
+    "SentryBlock",
+}
+
+# Client methods that are not throttled: session handling, which must work while the account is
+# paused, and local helpers that parse URLs or ids without making a request
+PASSTHROUGH_METHODS = {
+    "login",
+    "relogin",
+    "load_settings",
+    "dump_settings",
+    "get_settings",
+    "set_settings",
+    "media_pk_from_url",
+    "media_pk_from_code",
+    "media_code_from_pk",
+    "media_pk",
+    "story_pk_from_url",
+    "highlight_pk_from_url",
+    "share_code_from_url",
+    "share_info",
+    "generate_uuid",
+    "generate_mutation_token",
+    "with_query_params",
+}
+
+
+def is_rate_limited(error):
+    """True if an exception raised by an instagrapi call is Instagram rate limiting the account."""
+    if any(cls.__name__ in RATE_LIMIT_ERRORS for cls in type(error).__mro__):
+        return True
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) == 429
+
+
+class ThrottledError(Exception):
+    """Raised instead of calling Instagram while the account is paused after rate limiting."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"Instagram is rate limiting {name}; calls are paused, retry in {retry_after:.0f} s.")
+        self.retry_after = retry_after
+
+
+class Throttle:
+    """Adaptive concurrency, pacing and circuit breaking for one Instagram account.
+
+    Calls start at least `interval` seconds apart with at most `limit` in flight. Both adapt AIMD
+    style: each success adds to the concurrency limit and takes a step off the interval; each
+    rate-limit error halves the limit and doubles the interval. A rate-limit error also opens the
+    circuit: for a jittered, exponentially growing backoff every call fails fast with ThrottledError
+    instead of spending a request that would be rejected. After the backoff a single probe call is
+    let through (half-open); its success closes the circuit, another rate-limit error reopens it.
+    """
+
+    def __init__(self, name, max_concurrency=4, min_interval=0.5, max_interval=30.0, interval_step=0.1,
+                 base_backoff=60.0, max_backoff=1800.0, jitter=0.3):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval_step = interval_step
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+
+        self.limit = float(max_concurrency)
+        self.interval = min_interval
+        self.in_flight = 0
+        self.penalties = 0  # Consecutive rate-limit episodes; 0 means the circuit is closed
+        self.open_until = 0.0
+        self.probing = False
+        self._next_start = 0.0
+        self._cond = threading.Condition()
+        self.calls = 0
+        self.rate_limited = 0
+        self.rejected = 0
+
+    def retry_after(self):
+        """Seconds until calls are let through again (0 when the circuit is not open)."""
+        with self._cond:
+            return max(0.0, self.open_until - time.monotonic())
+
+    def _acquire(self):
+        """Waits for a concurrency slot and the pacing interval. Returns True for a half-open probe."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if now < self.open_until:
+                    self.rejected += 1
+                    raise ThrottledError(self.name, self.open_until - now)
+                # Half-open lets one probe through at a time; closed allows up to the current limit
+                if self.in_flight < (1 if self.penalties else int(self.limit)) and not self.probing:
+                    break
+                self._cond.wait(timeout=1.0)
+            probe = self.penalties > 0
+            self.probing = probe
+            self.in_flight += 1
+            self.calls += 1
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+        return probe
+
+    def _release(self, probe, outcome):
+        """outcome is 'ok', 'rate_limited' or 'error' (a failure unrelated to rate limiting)."""
+        with self._cond:
+            now = time.monotonic()
+            self.in_flight -= 1
+            if probe:
+                self.probing = False
+            if outcome == "rate_limited":
+                self.rate_limited += 1
+                if now >= self.open_until:
+                    # New episode (calls already in flight when the circuit opened don't extend it)
+                    self.penalties += 1
+                    self.limit = max(1.0, self.limit / 2)
+                    self.interval = min(self.max_interval, max(self.interval * 2, self.min_interval, 1.0))
+                    backoff = min(self.max_backoff, self.base_backoff * 2 ** (self.penalties - 1))
+                    backoff *= random.uniform(1 - self.jitter, 1 + self.jitter)
+                    self.open_until = now + backoff
+                    logger.warning(f"Instagram is rate limiting {self.name}; pausing calls for {backoff:.0f} s.")
+            elif outcome == "ok":
+                if probe:
+                    logger.info(f"Rate limiting of {self.name} has lifted; resuming calls.")
+                    self.penalties = 0
+                if not self.penalties:
+                    self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+                    self.interval = max(self.min_interval, self.interval - self.interval_step)
+            self._cond.notify_all()
+
+    def call(self, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs) under the throttle."""
+        probe = self._acquire()
+        outcome = "error"
+        try:
+            result = fn(*args, **kwargs)
+            outcome = "ok"
+            return result
+        except Exception as e:
+            if is_rate_limited(e):
+                outcome = "rate_limited"
+            raise
+        finally:
+            self._release(probe, outcome)
+
+    def state(self):
+        with self._cond:
+            now = time.monotonic()
+            if now < self.open_until:
+                state = "open"
+            elif self.penalties:
+                state = "half_open"
+            else:
+                state = "closed"
+            return {
+                "account": self.name,
+                "state": state,
+                "retry_after": round(max(0.0, self.open_until - now), 1),
+                "concurrency_limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "interval": round(self.interval, 2),
+                "consecutive_penalties": self.penalties,
+                "calls": self.calls,
+                "rate_limited": self.rate_limited,
+                "rejected": self.rejected,
+            }
+
+
+class ThrottledClient:
+    """Wraps an instagrapi Client so every request method goes through a Throttle.
+
+    Attribute reads and writes go to the wrapped client; the methods in PASSTHROUGH_METHODS are
+    called directly, so they keep working while the account is paused.
+    """
+
+    def __init__(self, client, throttle):
+        object.__setattr__(self, "_client", client)
+        object.__setattr__(self, "throttle", throttle)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith("_") or name in PASSTHROUGH_METHODS or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def throttled(*args, **kwargs):
+            return self.throttle.call(attr, *args, **kwargs)
+        return throttled
+
+    def __setattr__(self, name, value):
+        setattr(self._client, name, value)
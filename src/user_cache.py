@@ -0,0 +1,119 @@
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_ids (
+    username TEXT PRIMARY KEY,
+    user_id TEXT, -- NULL records a username that does not exist
+    resolved_at REAL NOT NULL
+);
+"""
+
+SQL_GET = "SELECT user_id, resolved_at FROM user_ids WHERE username = ?"
+SQL_PUT = "INSERT OR REPLACE INTO user_ids (username, user_id, resolved_at) VALUES (?, ?, ?)"
+
+
+class UserIdCache:
+    """Shared username -> user ID cache for the MCP tools.
+
+    Lookups go to an in-memory LRU first, then to a small SQLite table that survives restarts, and
+    only then to Instagram. Usernames that do not exist are cached too, for a shorter time, so a
+    typo does not cost a round trip on every call.
+    """
+
+    def __init__(self, db_path, ttl=7 * 24 * 3600, negative_ttl=3600, maxsize=10000, not_found_exceptions=()):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self.not_found_exceptions = tuple(not_found_exceptions)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+
+    @staticmethod
+    def _key(username):
+        return username.strip().lstrip("@").lower()
+
+    def _fresh(self, user_id, resolved_at):
+        ttl = self.ttl if user_id is not None else self.negative_ttl
+        return time.time() - resolved_at < ttl
+
+    def _remember(self, key, user_id, resolved_at):
+        self._entries[key] = (user_id, resolved_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _lookup(self, key):
+        """Returns (found, user_id) from memory or disk without going to Instagram."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self._fresh(*entry):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                if entry[0] is None:
+                    self.negative_hits += 1
+                return True, entry[0]
+
+            row = self._conn.execute(SQL_GET, (key,)).fetchone()
+            if row and self._fresh(*row):
+                self._remember(key, *row)
+                self.hits += 1
+                self.disk_hits += 1
+                if row[0] is None:
+                    self.negative_hits += 1
+                return True, row[0]
+
+            self.misses += 1
+            return False, None
+
+    def store(self, username, user_id):
+        """Records a resolution (user_id None for an unknown username)."""
+        key = self._key(username)
+        resolved_at = time.time()
+        user_id = str(user_id) if user_id is not None else None
+        with self._lock:
+            self._remember(key, user_id, resolved_at)
+            with self._conn:
+                self._conn.execute(SQL_PUT, (key, user_id, resolved_at))
+
+    def resolve(self, username, fetch):
+        """Returns the user ID for a username, or None if it does not exist.
+
+        `fetch(username)` is only called on a cache miss. Other errors from it propagate uncached.
+        """
+        key = self._key(username)
+        found, user_id = self._lookup(key)
+        if found:
+            return user_id
+
+        try:
+            user_id = fetch(key)
+        except self.not_found_exceptions:
+            user_id = None
+        self.store(key, user_id or None)
+        return str(user_id) if user_id else None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries_in_memory": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
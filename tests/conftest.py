@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the MCP server's caches out of the working tree
+_cache_dir = tempfile.mkdtemp(prefix="instagram-dm-mcp-tests-")
+os.environ.setdefault("INSTAGRAM_CACHE_DB", os.path.join(_cache_dir, "instagram_cache.db"))
+os.environ.setdefault("INSTAGRAM_MEDIA_CACHE_DIR", os.path.join(_cache_dir, "media"))
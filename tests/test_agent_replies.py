@@ -0,0 +1,61 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("instagrapi")
+pytest.importorskip("google.generativeai")
+
+from src.agent import InstagramAppointmentSetter
+
+MY_USER_ID = "1"
+LEAD_ID = "2"
+
+
+class InboxClient:
+    """Serves one thread in which the lead answered the outreach message; direct_send can be made to fail."""
+
+    def __init__(self):
+        self.send_error = None
+        self.sent = []
+
+    def direct_threads(self, amount, thread_message_limit):
+        messages = [
+            SimpleNamespace(id="m2", user_id=LEAD_ID, text="¿cuánto cuesta?", item_type="text"),
+            SimpleNamespace(id="m1", user_id=MY_USER_ID, text="hola", item_type="text"),
+        ]
+        user = SimpleNamespace(pk=LEAD_ID, username="lead")
+        return [SimpleNamespace(id="t1", users=[user], last_activity_at=datetime(2026, 1, 1), messages=messages)]
+
+    def direct_send(self, text, user_ids):
+        if self.send_error:
+            raise self.send_error
+        self.sent.append((user_ids, text))
+        return SimpleNamespace(id=f"r{len(self.sent)}")
+
+
+@pytest.fixture
+def agent(tmp_path):
+    agent = InstagramAppointmentSetter("me", "password", db_path=str(tmp_path / "leads.db"))
+    agent.my_user_id = MY_USER_ID
+    agent.client = InboxClient()
+    agent.model = SimpleNamespace(generate_content=lambda prompt: SimpleNamespace(text="Cuesta 100 $"))
+    agent.reply_pipeline.min_send_interval = 0
+    agent.store.record_initial_send(LEAD_ID, "lead", "Lead", "hola", "m1")
+    yield agent
+    agent.store.close()
+
+
+def test_failed_reply_is_retried_on_the_next_check(agent):
+    agent.client.send_error = RuntimeError("Please wait a few minutes before you try again.")
+    agent.monitor_and_process_replies()
+
+    assert agent.store.count_with_status('replied') == 0
+    assert agent.store.thread_watermarks(["t1"]) == {}
+
+    agent.client.send_error = None
+    agent.monitor_and_process_replies()
+
+    assert agent.client.sent == [([LEAD_ID], "Cuesta 100 $")]
+    assert agent.store.count_with_status('replied') == 1
+    assert agent.store.thread_watermarks(["t1"])["t1"][1] == "m2"
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.harvester import FollowerHarvester
+from src.lead_store import LeadStore
+
+
+class PleaseWaitFewMinutes(Exception):
+    pass
+
+
+class FollowersClient:
+    """Serves followers 0..total-1 in chunks addressed by their start offset, failing on one chunk."""
+
+    def __init__(self, total, fail_at=None):
+        self.total = total
+        self.fail_at = fail_at
+        self.calls = 0
+
+    def user_id_from_username(self, username):
+        return "42"
+
+    def user_followers_v1_chunk(self, user_id, max_amount, max_id):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            raise PleaseWaitFewMinutes("Please wait a few minutes before you try again.")
+        start = int(max_id or 0)
+        end = min(start + max_amount, self.total)
+        users = [SimpleNamespace(pk=pk, username=f"user{pk}") for pk in range(start, end)]
+        return users, str(end) if end < self.total else ""
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LeadStore(str(tmp_path / "leads.db"))
+    yield store
+    store.close()
+
+
+def test_harvest_keeps_candidates_when_a_later_chunk_is_rate_limited(store):
+    harvester = FollowerHarvester(FollowersClient(total=50, fail_at=3), store, chunk_size=5)
+
+    candidates = harvester.harvest("target", needed=30)
+
+    assert [user.pk for user in candidates] == list(range(10))
+    assert store.get_frontier("target") == ("42", "10")
+
+
+def test_harvest_resumes_from_the_saved_cursor(store):
+    client = FollowersClient(total=50)
+    harvester = FollowerHarvester(client, store, chunk_size=5)
+
+    first = harvester.harvest("target", needed=5)
+    second = harvester.harvest("target", needed=5)
+
+    assert [user.pk for user in first] == list(range(5))
+    assert [user.pk for user in second] == list(range(5, 10))
+
+
+def test_harvest_raises_when_nothing_was_collected(store):
+    harvester = FollowerHarvester(FollowersClient(total=50, fail_at=1), store, chunk_size=5)
+
+    with pytest.raises(PleaseWaitFewMinutes):
+        harvester.harvest("target", needed=5)
+    assert store.get_frontier("target") is None
@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+pytest.importorskip("instagrapi")
+pytest.importorskip("mcp")
+
+from instagrapi import Client
+
+from src import mcp_server
+from src.inbox_mirror import InboxMirror, InboxSyncer
+
+THREAD_1 = "340282366841710300949128100000000001"
+THREAD_2 = "340282366841710300949128100000000002"
+
+
+def thread_payload(thread_id, activity, messages):
+    return {
+        "thread_id": thread_id,
+        "thread_v2_id": thread_id,
+        "users": [{"pk": "2", "username": "lead"}],
+        "items": [
+            {"item_id": item_id, "user_id": 2, "timestamp": activity - i, "item_type": "text", "text": f"msg {item_id}"}
+            for i, item_id in enumerate(messages)
+        ],
+        "admin_user_ids": [],
+        "last_activity_at": activity,
+        "muted": False,
+        "named": False,
+        "canonical": True,
+        "pending": False,
+        "archived": False,
+        "thread_type": "private",
+        "thread_title": "lead",
+        "folder": 0,
+        "vc_muted": False,
+        "is_group": False,
+        "mentions_muted": False,
+        "approval_required_for_new_members": False,
+        "input_mode": 0,
+        "business_thread_folder": 0,
+        "read_state": 0,
+        "is_close_friend_thread": False,
+        "assigned_admin_id": 0,
+        "shh_mode_enabled": False,
+        "last_seen_at": {},
+    }
+
+
+@pytest.fixture
+def instagram():
+    """A real instagrapi Client registered as the server's default account, with private_request stubbed."""
+    now = int(time.time()) * 1_000_000
+    pages = {
+        None: {"inbox": {"threads": [thread_payload(THREAD_1, now, ["m2", "m1"])], "oldest_cursor": "c1"}},
+        "c1": {"inbox": {"threads": [thread_payload(THREAD_2, now - 10_000_000, ["m3"])], "oldest_cursor": None}},
+    }
+    cl = Client()
+    cl.authorization_data = {"ds_user_id": "1", "sessionid": "session"}
+    cl.requests = []
+
+    def private_request(endpoint, params=None, **kwargs):
+        assert endpoint == "direct_v2/inbox/", endpoint
+        cl.requests.append(params)
+        return pages[params.get("cursor")]
+
+    cl.private_request = private_request
+    mcp_server.client_pool.add("tester", cl, default=True)
+    return cl
+
+
+def test_sync_once_fills_mirror_from_inbox(instagram, tmp_path):
+    mirror = InboxMirror(str(tmp_path / "mirror.db"))
+    syncer = InboxSyncer(mirror, mcp_server._mirror_inbox_page, mcp_server._mirror_message_page)
+
+    syncer.sync_once()
+
+    assert [params.get("cursor") for params in instagram.requests] == [None, "c1"]
+    for params in instagram.requests:
+        assert "folder" not in params
+        assert params["thread_message_limit"] == mcp_server.MIRROR_THREAD_MESSAGES
+    threads = mirror.threads(0, 10)
+    assert [str(thread["id"]) for thread in threads] == [THREAD_1, THREAD_2]
+    assert mirror.inbox_age() is not None
+    assert [m["id"] for m in mirror.messages(THREAD_1, 2, max_age=60)] == ["m2", "m1"]
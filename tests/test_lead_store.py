@@ -0,0 +1,14 @@
+from src.lead_store import LeadStore
+
+
+def test_append_messages_counts_only_new_messages(tmp_path):
+    store = LeadStore(str(tmp_path / "leads.db"))
+    try:
+        store.record_initial_send("1", "lead", "Lead", "hola", "m0")
+        assert store.append_messages("1", [("lead", "quiero info", "m1")]) == 1
+        assert store.append_messages("1", [("lead", "quiero info", "m1"), ("lead", "precio?", "m2"), ("agent", "claro", "m3")]) == 2
+        assert store.append_messages("1", [("lead", "precio?", "m2")]) == 0
+        hits, _ = store.search_conversations("precio")
+        assert len(hits) == 1
+    finally:
+        store.close()
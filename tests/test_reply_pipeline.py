@@ -0,0 +1,20 @@
+import threading
+import time
+
+from src.reply_pipeline import ReplyPipeline
+
+
+def test_stop_drops_replies_waiting_for_their_send_slot():
+    stop = threading.Event()
+    sent = []
+
+    def send(item, text):
+        sent.append(item)
+        stop.set()  # Stop requested right after the first reply went out
+
+    pipeline = ReplyPipeline(lambda job: job, lambda item: "hola", send, min_send_interval=5.0, stop_event=stop)
+    started = time.monotonic()
+
+    assert pipeline.run(range(8)) == 1
+    assert len(sent) == 1
+    assert time.monotonic() - started < 1.0
@@ -0,0 +1,19 @@
+from datetime import datetime
+
+from src.scheduler import SendScheduler
+
+
+def test_equal_start_and_end_hours_are_active_around_the_clock():
+    scheduler = SendScheduler(24, active_hours=(9, 9))
+
+    assert scheduler.interval == 3600
+    assert all(scheduler.in_active_hours(datetime(2026, 1, 1, hour)) for hour in range(24))
+
+
+def test_window_wrapping_midnight():
+    scheduler = SendScheduler(10, active_hours=(22, 2))
+
+    assert scheduler.in_active_hours(datetime(2026, 1, 1, 23))
+    assert scheduler.in_active_hours(datetime(2026, 1, 1, 1))
+    assert not scheduler.in_active_hours(datetime(2026, 1, 1, 2))
+    assert not scheduler.in_active_hours(datetime(2026, 1, 1, 12))
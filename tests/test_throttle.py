@@ -0,0 +1,35 @@
+import pytest
+
+from src.throttle import Throttle, ThrottledClient, ThrottledError
+
+
+class PleaseWaitFewMinutes(Exception):
+    pass
+
+
+class FakeClient:
+    def __init__(self):
+        self.requests = 0
+
+    def media_info(self, media_pk):
+        self.requests += 1
+        raise PleaseWaitFewMinutes("Please wait a few minutes before you try again.")
+
+    def media_pk_from_url(self, url):
+        return url.rstrip("/").rsplit("/", 1)[-1]
+
+
+def test_rate_limit_pauses_requests_but_not_local_helpers():
+    client = ThrottledClient(FakeClient(), Throttle("acct", min_interval=0))
+
+    with pytest.raises(PleaseWaitFewMinutes):
+        client.media_info("1")
+    with pytest.raises(ThrottledError):
+        client.media_info("1")
+
+    assert client.requests == 1
+    assert client.media_pk_from_url("https://www.instagram.com/p/123/") == "123"
+    state = client.throttle.state()
+    assert state["state"] == "open"
+    assert state["concurrency_limit"] == 2
+    assert state["rejected"] == 1